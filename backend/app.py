@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from controller.CategoryController import router as category_router
 from controller.CategorySortingController import router as category_sorting_router
@@ -5,19 +6,38 @@ from controller.StockItemController import router as stock_item_router
 from controller.StockItemSortingController import router as stock_item_sorting_router
 from controller.BillController import router as bill_router
 from controller.DepositReturnController import router as deposit_return_router
+from controller.CatalogController import router as catalog_router
 from fastapi.middleware.cors import CORSMiddleware
+from database import SessionLocal
+import service.BillIngestQueue as BillIngestQueue
+import os
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # BILL_INGEST_MODE=queued aktiviert den Write-Behind-Modus für POST /bills/ (siehe service/BillIngestQueue.py)
+    if os.getenv("BILL_INGEST_MODE", "direct") == "queued":
+        BillIngestQueue.start(
+            SessionLocal,
+            flush_interval_ms=float(os.getenv("BILL_GROUP_COMMIT_MS", "5")),
+            durability=os.getenv("BILL_INGEST_DURABILITY", "commit"),
+            id_block_size=int(os.getenv("BILL_ID_BLOCK_SIZE", "100")),
+        )
+    yield
+    BillIngestQueue.stop()
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(category_router)
 app.include_router(category_sorting_router)
 app.include_router(stock_item_router)
 app.include_router(stock_item_sorting_router)
 app.include_router(bill_router)
 app.include_router(deposit_return_router)
+app.include_router(catalog_router)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # oder ["*"] für offen
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
\ No newline at end of file
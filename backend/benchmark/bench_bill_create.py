@@ -0,0 +1,57 @@
+# Misst die Latenz von BillService.create in Abhängigkeit von der Anzahl der Rechnungspositionen.
+# Aufruf (aus backend/): DATABASE_HOST=localhost python benchmark/bench_bill_create.py
+import sys
+import os
+import time
+import statistics
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from entity.DAO import Base, Category, StockItem, ItemVariant
+from service import BillService
+
+BENCH_DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres_db")
+engine = create_engine(f"postgresql://root:root@{BENCH_DATABASE_HOST}:5432/huettenzauber_test")
+BenchSessionLocal = sessionmaker(autoflush=True, bind=engine)
+
+LINE_COUNTS = [1, 5, 10, 30, 60]
+ROUNDS = 50
+
+def seed_variants(db, n):
+    category = Category(name="Bench", icon="MdTest")
+    db.add(category)
+    db.flush()
+    variants = []
+    for i in range(n):
+        item = StockItem(name=f"Item{i}", category_id=category.id, deposit_amount=0.0, is_active=True, version=1)
+        db.add(item)
+        db.flush()
+        variant = ItemVariant(stock_item_id=item.id, name="Standard", price=1.0 + i, bill_steps=1.0, is_active=True, version=1)
+        db.add(variant)
+        variants.append(variant)
+    db.commit()
+    return [v.id for v in variants]
+
+def main():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = BenchSessionLocal()
+    try:
+        variant_ids = seed_variants(db, max(LINE_COUNTS))
+        print(f"{'Positionen':>10} {'Median ms':>10} {'p95 ms':>10}")
+        for lines in LINE_COUNTS:
+            items = [{"item_variant_id": variant_ids[i], "item_quantity": 1} for i in range(lines)]
+            timings = []
+            for _ in range(ROUNDS):
+                start = time.perf_counter()
+                BillService.create(db, datetime(2024, 1, 1, 12, 0), items)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            print(f"{lines:>10} {statistics.median(timings):>10.2f} {timings[int(len(timings) * 0.95) - 1]:>10.2f}")
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+if __name__ == "__main__":
+    main()
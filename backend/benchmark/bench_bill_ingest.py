@@ -0,0 +1,77 @@
+# Vergleicht den Durchsatz von POST /bills/ im direkten Modus mit dem Write-Behind-Modus (BillIngestQueue).
+# Mehrere Threads simulieren parallel kassierende Terminals.
+# Aufruf (aus backend/): DATABASE_HOST=localhost python benchmark/bench_bill_ingest.py
+import sys
+import os
+import time
+import threading
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from entity.DAO import Base, Category, StockItem, ItemVariant
+from service import BillService
+import service.BillIngestQueue as BillIngestQueue
+
+BENCH_DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres_db")
+engine = create_engine(f"postgresql://root:root@{BENCH_DATABASE_HOST}:5432/huettenzauber_test", pool_size=20)
+BenchSessionLocal = sessionmaker(autoflush=True, bind=engine)
+
+TERMINALS = 12
+BILLS_PER_TERMINAL = 200
+LINES_PER_BILL = 3
+
+def seed_variants(db, n):
+    category = Category(name="Bench", icon="MdTest")
+    db.add(category)
+    db.flush()
+    variants = []
+    for i in range(n):
+        item = StockItem(name=f"Item{i}", category_id=category.id, deposit_amount=0.0, is_active=True, version=1)
+        db.add(item)
+        db.flush()
+        variant = ItemVariant(stock_item_id=item.id, name="Standard", price=1.0 + i, bill_steps=1.0, is_active=True, version=1)
+        db.add(variant)
+        variants.append(variant)
+    db.commit()
+    return [v.id for v in variants]
+
+def run_terminals(create, items):
+    def terminal():
+        db = BenchSessionLocal()
+        try:
+            for _ in range(BILLS_PER_TERMINAL): create(db, datetime.now(), items)
+        finally:
+            db.close()
+    threads = [threading.Thread(target=terminal) for _ in range(TERMINALS)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return start
+
+def main():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = BenchSessionLocal()
+    try:
+        variant_ids = seed_variants(db, LINES_PER_BILL)
+    finally:
+        db.close()
+    items = [{"item_variant_id": v, "item_quantity": 1} for v in variant_ids]
+    total = TERMINALS * BILLS_PER_TERMINAL
+    print(f"{TERMINALS} Terminals x {BILLS_PER_TERMINAL} Rechnungen mit je {LINES_PER_BILL} Positionen")
+    print(f"{'Modus':>22} {'Rechnungen/s':>14}")
+
+    start = run_terminals(BillService.create, items)
+    print(f"{'direct':>22} {total / (time.perf_counter() - start):>14.0f}")
+
+    for durability in BillIngestQueue.DURABILITY_MODES:
+        BillIngestQueue.start(BenchSessionLocal, flush_interval_ms=5, durability=durability)
+        start = run_terminals(BillIngestQueue.submit, items)
+        BillIngestQueue.stop()
+        print(f"{'queued/' + durability:>22} {total / (time.perf_counter() - start):>14.0f}")
+
+    Base.metadata.drop_all(bind=engine)
+
+if __name__ == "__main__":
+    main()
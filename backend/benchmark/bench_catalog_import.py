@@ -0,0 +1,56 @@
+# Vergleicht das Anlegen einer Speisekarte Artikel für Artikel (wie die Verwaltungsoberfläche über
+# POST /stock-items/ und POST /item-variants/) mit dem mengenbasierten Import (POST /catalog/import).
+# Aufruf (aus backend/): DATABASE_HOST=localhost python benchmark/bench_catalog_import.py
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from entity.DAO import Base
+import service.CategoryService as CategoryService
+import service.StockItemService as StockItemService
+import service.ItemVariantService as ItemVariantService
+import service.CatalogImportService as CatalogImportService
+
+BENCH_DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres_db")
+engine = create_engine(f"postgresql://root:root@{BENCH_DATABASE_HOST}:5432/huettenzauber_test")
+BenchSessionLocal = sessionmaker(autoflush=False, bind=engine)
+
+CATEGORIES = 10
+ITEMS = 500
+VARIANTS_PER_ITEM = 2
+
+def menu():
+    return [{"name": f"Kategorie {c}", "icon": "MdCategory", "items": [
+        {"name": f"Artikel {i}", "deposit_amount": 0.0, "variants": [
+            {"name": f"Variante {v}", "price": 1.0 + i + v, "bill_steps": 1.0 + v} for v in range(VARIANTS_PER_ITEM)]}
+        for i in range(c, ITEMS, CATEGORIES)]} for c in range(CATEGORIES)]
+
+def one_by_one(db, categories):
+    for category in categories:
+        category_id = CategoryService.create(db, category["name"], category["icon"]).id
+        for item in category["items"]:
+            stock_item = StockItemService.create(db, item["name"], category_id, item["deposit_amount"])
+            for v in item["variants"]: ItemVariantService.create(db, stock_item.id, v["name"], v["price"], v["bill_steps"])
+
+def timed(run):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = BenchSessionLocal()
+    try:
+        start = time.perf_counter()
+        run(db, menu())
+        return time.perf_counter() - start
+    finally:
+        db.close()
+
+def main():
+    print(f"{ITEMS} Artikel mit je {VARIANTS_PER_ITEM} Varianten in {CATEGORIES} Kategorien")
+    print(f"{'Modus':>12} {'Sekunden':>10}")
+    print(f"{'einzeln':>12} {timed(one_by_one):>10.3f}")
+    print(f"{'import':>12} {timed(CatalogImportService.import_catalog):>10.3f}")
+    Base.metadata.drop_all(bind=engine)
+
+if __name__ == "__main__":
+    main()
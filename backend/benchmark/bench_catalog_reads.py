@@ -0,0 +1,106 @@
+# Misst die CPU-Zeit je Anfrage für die Artikel- und Variantenlisten: ORM-Objekte mit nachträglich gesetztem
+# Ersatznamen (bisheriger Lesepfad) gegen Rows mit Ersatznamen beim Serialisieren.
+# Der CatalogCache ist abgeschaltet, gemessen wird also jeweils der komplette Weg über die Datenbank.
+# Aufruf (aus backend/): DATABASE_HOST=localhost python benchmark/bench_catalog_reads.py
+import sys
+import os
+import time
+from typing import List
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from entity.DAO import Base, Category, StockItem, ItemSorting, ItemVariant
+import service.CatalogCache as CatalogCache
+import service.StockItemService as StockItemService
+import service.ItemVariantService as ItemVariantService
+from controller.StockItemController import StockItemDTO, _with_active_variants
+from controller.ItemVariantController import ItemVariantDTO, _to_dto
+
+BENCH_DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres_db")
+engine = create_engine(f"postgresql://root:root@{BENCH_DATABASE_HOST}:5432/huettenzauber_test")
+BenchSessionLocal = sessionmaker(autoflush=False, bind=engine)
+
+ITEMS = 500
+VARIANTS_PER_ITEM = 3
+VARIANTS_OF_LARGE_ITEM = 300
+REQUESTS = 100
+
+items_json = TypeAdapter(List[StockItemDTO])
+variants_json = TypeAdapter(List[ItemVariantDTO])
+
+def seed(db):
+    category = Category(name="Bench", icon="MdTest")
+    db.add(category)
+    db.flush()
+    for i in range(ITEMS):
+        item = StockItem(name=f"Artikel {i}", category_id=category.id, deposit_amount=0.0, is_active=True, version=1)
+        # Jede dritte Variante ohne Namen, die bekommt den Ersatznamen
+        item.item_variants = [ItemVariant(name=f"V{v}" if v else None, price=1.0 + v, bill_steps=1.0 + v, is_active=True, version=1)
+                              for v in range(VARIANTS_PER_ITEM)]
+        db.add(item)
+        db.flush()
+        db.add(ItemSorting(item_id=item.id, sort_order=i))
+    # Ein Artikel mit vielen Varianten für die Variantenliste
+    large = StockItem(name="Groß", category_id=category.id, deposit_amount=0.0, is_active=True, version=1)
+    large.item_variants = [ItemVariant(name=f"V{v}" if v % 3 else None, price=1.0 + v, bill_steps=1.0 + v, is_active=True, version=1)
+                           for v in range(VARIANTS_OF_LARGE_ITEM)]
+    db.add(large)
+    db.commit()
+    return large.id
+
+def _fallback(variant):
+    if variant.name is None or variant.name.strip() == "": variant.name = str(variant.bill_steps)
+    return variant
+
+def orm_items(db, _):
+    items = (db.query(StockItem).outerjoin(ItemSorting, StockItem.id == ItemSorting.item_id)
+             .filter(StockItem.is_active).order_by(ItemSorting.sort_order.nullslast(), StockItem.id).all())
+    variants = {item.id: [] for item in items}
+    for v in db.query(ItemVariant).filter(ItemVariant.stock_item_id.in_(variants.keys()), ItemVariant.is_active).order_by(ItemVariant.id):
+        variants[v.stock_item_id].append(_fallback(v))
+    return items_json.dump_json([StockItemDTO(id=item.id, name=item.name, category_id=item.category_id, deposit_amount=item.deposit_amount,
+                                              is_active=item.is_active, item_variants=variants[item.id]) for item in items])
+
+def row_items(db, _):
+    return items_json.dump_json(_with_active_variants(db, StockItemService.get_all(db)))
+
+def orm_variants(db, stock_item_id):
+    variants = db.query(ItemVariant).filter(ItemVariant.stock_item_id == stock_item_id).order_by(ItemVariant.id).all()
+    return variants_json.dump_json([ItemVariantDTO.model_validate(_fallback(v)) for v in variants])
+
+def row_variants(db, stock_item_id):
+    return variants_json.dump_json([_to_dto(v) for v in ItemVariantService.get_all_in_stock_item(db, stock_item_id)])
+
+def cpu_ms(handler, arg):
+    total = 0.0
+    for _ in range(REQUESTS):
+        db = BenchSessionLocal()
+        start = time.process_time()
+        handler(db, arg)
+        # Wie get_db am Ende einer Anfrage
+        db.close()
+        total += time.process_time() - start
+    return total / REQUESTS * 1000
+
+def main():
+    CatalogCache.ENABLED = False
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = BenchSessionLocal()
+    try:
+        stock_item_id = seed(db)
+    finally:
+        db.close()
+    print(f"{ITEMS} Artikel mit je {VARIANTS_PER_ITEM} Varianten, Variantenliste mit {VARIANTS_OF_LARGE_ITEM} Einträgen")
+    print(f"CPU-Zeit je Anfrage (Mittel über {REQUESTS})")
+    print(f"{'Liste':>12} {'ORM ms':>10} {'Rows ms':>10}")
+    for label, orm, rows, arg in (("Artikel", orm_items, row_items, None), ("Varianten", orm_variants, row_variants, stock_item_id)):
+        # Einmal vorab, damit Statement-Caches warm sind
+        cpu_ms(orm, arg)
+        cpu_ms(rows, arg)
+        print(f"{label:>12} {cpu_ms(orm, arg):>10.2f} {cpu_ms(rows, arg):>10.2f}")
+    Base.metadata.drop_all(bind=engine)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Misst die Latenz einer Artikelbearbeitung (PUT /stock-items/{id}, StockItemService.update_with_variants:
+# neue Version des Artikels samt Varianten in einer Transaktion) für unterschiedlich viele Varianten.
+# Aufruf (aus backend/): DATABASE_HOST=localhost python benchmark/bench_stock_item_update.py
+import sys
+import os
+import time
+import statistics
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from entity.DAO import Base, Category, StockItem, ItemVariant
+import service.StockItemService as StockItemService
+
+BENCH_DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres_db")
+engine = create_engine(f"postgresql://root:root@{BENCH_DATABASE_HOST}:5432/huettenzauber_test")
+BenchSessionLocal = sessionmaker(autoflush=False, bind=engine)
+
+VARIANT_COUNTS = (1, 4, 16)
+EDITS = 200
+
+def seed(db, n_variants):
+    category = Category(name="Bench", icon="MdTest")
+    db.add(category)
+    db.flush()
+    item = StockItem(name="Bier", category_id=category.id, deposit_amount=0.0, is_active=True, version=1)
+    item.item_variants = [ItemVariant(name=f"Variante {i}", price=1.0 + i, bill_steps=1.0 + i, is_active=True, version=1) for i in range(n_variants)]
+    db.add(item)
+    db.commit()
+    return category.id, item.id
+
+def variants_of(db, item_id, round):
+    return [{"id": v.id, "name": v.name, "price": v.price + round % 2, "bill_steps": v.bill_steps}
+            for v in db.query(ItemVariant).filter(ItemVariant.stock_item_id == item_id, ItemVariant.is_active).order_by(ItemVariant.id)]
+
+def measure(n_variants):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = BenchSessionLocal()
+    try:
+        category_id, item_id = seed(db, n_variants)
+        latencies = []
+        for round in range(EDITS):
+            variants = variants_of(db, item_id, round)
+            start = time.perf_counter()
+            item_id = StockItemService.update_with_variants(db, item_id, "Bier", category_id, 0.0, variants).id
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+    finally:
+        db.close()
+
+def main():
+    print(f"{EDITS} Bearbeitungen eines Artikels")
+    print(f"{'Varianten':>10} {'Median ms':>10} {'p95 ms':>10}")
+    for n_variants in VARIANT_COUNTS:
+        latencies = sorted(measure(n_variants))
+        print(f"{n_variants:>10} {statistics.median(latencies):>10.2f} {latencies[int(len(latencies) * 0.95)]:>10.2f}")
+    Base.metadata.drop_all(bind=engine)
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,160 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from database import get_db
+import controller.ETag as ETag
 from service import BillService
-from pydantic import BaseModel
-from typing import List
-from datetime import date, datetime
+import service.ExportService as ExportService
+import service.BillIngestQueue as BillIngestQueue
+import service.TimeRange as TimeRange
+from service.TimeRange import DateOrTime
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import datetime
 
 router = APIRouter(prefix="/bills", tags=["bills"])
 
-class BillItemDTO(BaseModel):
+BILL_PAGE_SIZE_MAX = 500
+BILL_BATCH_SIZE_MAX = 1000
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", ExportService.to_csv),
+    "ndjson": ("application/x-ndjson", ExportService.to_ndjson),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ExportService.to_xlsx),
+}
+
+class BillItemCreateDTO(BaseModel):
     item_variant_id: int
     item_quantity: float = 1
 
+class BillItemDTO(BillItemCreateDTO):
+    item_price: Optional[float] = None
+    item_deposit_amount: Optional[float] = None
+    item_name: Optional[str] = None
+
 class BillDTO(BaseModel):
     id: int = None
-    date: date
+    date: datetime
     items: List[BillItemDTO]
     is_deleted: bool = False
+    total_amount: Optional[float] = None
+    deposit_total: Optional[float] = None
 
 class BillCreateDTO(BaseModel):
-    items: List[BillItemDTO]
+    items: List[BillItemCreateDTO]
+
+class BillBatchEntryDTO(BaseModel):
+    client_id: str = Field(..., min_length=1, max_length=36)
+    date: Optional[datetime] = None
+    items: List[BillItemCreateDTO]
+
+class BillBatchDTO(BaseModel):
+    bills: List[BillBatchEntryDTO] = Field(..., max_length=BILL_BATCH_SIZE_MAX)
 
-@router.get("/", response_model=List[BillDTO])
-def list_bills(db: Session = Depends(get_db)):
-    return BillService.get_all(db)
+class BillBatchResultDTO(BaseModel):
+    client_id: str
+    id: int
+    created: bool
 
-@router.get("/all", response_model=List[BillDTO])
-def get_all_bills_with_deleted(db: Session = Depends(get_db)):
-    return BillService.get_all_with_deleted(db)
+class SalesStatDTO(BaseModel):
+    category_id: int
+    category_name: str
+    stock_item_id: int
+    stock_item_name: str
+    item_variant_id: int
+    variant_name: str
+    bill_steps: float
+    quantity: float
+    revenue: float
+
+# Ohne limit wird wie bisher die komplette Liste geliefert; mit limit enthält der Header X-Next-Cursor
+# den Cursor für die nächste Seite (fehlt auf der letzten Seite)
+@router.get("/", response_model=List[BillDTO], dependencies=[Depends(ETag.bills)])
+def list_bills(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=BILL_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    date_from: Optional[DateOrTime] = None,
+    date_to: Optional[DateOrTime] = None,
+    db: Session = Depends(get_db)
+):
+    bills, next_cursor = BillService.get_all(db, limit, cursor, date_from, date_to)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return bills
+
+@router.get("/all", response_model=List[BillDTO], dependencies=[Depends(ETag.bills)])
+def get_all_bills_with_deleted(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=BILL_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    date_from: Optional[DateOrTime] = None,
+    date_to: Optional[DateOrTime] = None,
+    is_deleted: Optional[bool] = None,
+    db: Session = Depends(get_db)
+):
+    bills, next_cursor = BillService.get_all_with_deleted(db, limit, cursor, date_from, date_to, is_deleted)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return bills
 
-@router.get("/{bill_id}", response_model=BillDTO)
+@router.get("/stats", response_model=List[SalesStatDTO], dependencies=[Depends(ETag.bills_and_catalog)])
+def get_sales_stats(
+    date_from: Optional[DateOrTime] = None,
+    date_to: Optional[DateOrTime] = None,
+    include_deleted: bool = False,
+    db: Session = Depends(get_db)
+):
+    return BillService.get_stats(db, date_from, date_to, include_deleted)
+
+@router.get("/export")
+def export_bills(
+    export_format: Literal["csv", "ndjson", "xlsx"] = Query("csv", alias="format"),
+    date_from: Optional[DateOrTime] = None,
+    date_to: Optional[DateOrTime] = None,
+    include_deleted: bool = False,
+    db: Session = Depends(get_db)
+):
+    media_type, writer = EXPORT_FORMATS[export_format]
+    def stream():
+        # Die Session wird erst nach dem letzten Block geschlossen, der Cursor lebt so lange wie die Response
+        try:
+            yield from writer(BillService.iter_export_rows(db, date_from, date_to, include_deleted), BillService.EXPORT_COLUMNS)
+        finally:
+            db.close()
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="rechnungen.{export_format}"'}
+    )
+
+@router.get("/{bill_id}", response_model=BillDTO, dependencies=[Depends(ETag.bills)])
 def get_bill(bill_id: int, db: Session = Depends(get_db)):
     return BillService.get_by_id(db, bill_id)
 
 @router.post("/", status_code=201, response_model=BillDTO)
 def create_bill(payload: BillCreateDTO, db: Session = Depends(get_db)):
-    bill = BillService.create(db, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), [item.model_dump() for item in payload.items])
-    return {"id": bill.id, "date": bill.date, "items": bill.items, "is_deleted": bill.is_deleted}
+    items = [item.model_dump() for item in payload.items]
+    if BillIngestQueue.is_running():
+        bill = BillIngestQueue.submit(db, datetime.now(), items)
+        total_amount, deposit_total = BillService.compute_totals(bill)
+        return {
+            "id": bill["id"], "date": bill["date"], "items": BillService.build_lines(bill), "is_deleted": False,
+            "total_amount": total_amount, "deposit_total": deposit_total
+        }
+    bill = BillService.create(db, datetime.now(), items)
+    return {
+        "id": bill.id, "date": bill.date, "items": bill.items, "is_deleted": bill.is_deleted,
+        "total_amount": bill.total_amount, "deposit_total": bill.deposit_total
+    }
+
+# Batch-Upload für Terminals nach einem Verbindungsabbruch; erneut gesendete client_ids werden übersprungen
+# und mit created=false und der bereits vergebenen ID zurückgemeldet
+@router.post("/batch", response_model=List[BillBatchResultDTO])
+def create_bills_batch(payload: BillBatchDTO, db: Session = Depends(get_db)):
+    now = datetime.now()
+    return BillService.create_batch(db, [
+        {"client_id": bill.client_id, "date": TimeRange.naive(bill.date) if bill.date else now, "items": [item.model_dump() for item in bill.items]}
+        for bill in payload.bills
+    ])
 
 @router.delete("/{bill_id}", status_code=204)
 def delete_bill(bill_id: int, db: Session = Depends(get_db)):
@@ -0,0 +1,142 @@
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from database import get_db
+import controller.ETag as ETag
+from pydantic import BaseModel, ValidationError
+from datetime import datetime
+from typing import List, Optional
+from controller.CategoryController import CategoryDTO
+from controller.CategorySortingController import CategorySortingDTO
+from controller.StockItemController import StockItemDTO
+from controller.StockItemSortingController import ItemSortingDTO
+import service.CatalogService as CatalogService
+import service.CatalogCache as CatalogCache
+import service.CatalogImportService as CatalogImportService
+import service.CatalogEvents as CatalogEvents
+import service.CatalogVersion as CatalogVersion
+
+KEEPALIVE_SECONDS = 15
+
+class CatalogCacheStatsDTO(BaseModel):
+    enabled: bool
+    version: int
+    entries: int
+    hits: int
+    misses: int
+
+class CatalogDTO(BaseModel):
+    change_cursor: int
+    categories: List[CategoryDTO]
+    category_sorting: List[CategorySortingDTO]
+    stock_items: List[StockItemDTO]
+    item_sorting: List[ItemSortingDTO]
+
+class StockItemChangeDTO(BaseModel):
+    id: int
+    name: str
+    category_id: int
+    deposit_amount: float
+    is_active: bool
+    change_seq: int
+
+class ItemVariantChangeDTO(BaseModel):
+    id: int
+    stock_item_id: int
+    name: str
+    price: float
+    bill_steps: float
+    is_active: bool
+    change_seq: int
+
+class CatalogChangesDTO(BaseModel):
+    cursor: int
+    stock_items: List[StockItemChangeDTO]
+    item_variants: List[ItemVariantChangeDTO]
+
+class ImportVariantDTO(BaseModel):
+    name: Optional[str] = None
+    price: float
+    bill_steps: float = 1.0
+
+class ImportStockItemDTO(BaseModel):
+    name: str
+    deposit_amount: float = 0.0
+    variants: List[ImportVariantDTO]
+
+class ImportCategoryDTO(BaseModel):
+    name: str
+    icon: Optional[str] = None
+    items: List[ImportStockItemDTO]
+
+class CatalogImportDTO(BaseModel):
+    categories: List[ImportCategoryDTO]
+
+class CatalogImportResultDTO(BaseModel):
+    categories_created: int
+    stock_items_created: int
+    item_variants_created: int
+    stock_item_ids: List[int]
+
+router = APIRouter(prefix="/catalog", tags=["Catalog"])
+
+# Alles, was ein Terminal beim Start braucht, in einer Antwort: nur aktive Artikel und Varianten.
+# as_of: der Katalog, wie er zu diesem Zeitpunkt galt (z.B. date einer Rechnung)
+@router.get("/", response_model=CatalogDTO)
+def get_catalog(as_of: Optional[datetime] = None, etag: str = Depends(ETag.catalog), db: Session = Depends(get_db)):
+    # Eine direkt zurückgegebene Response übernimmt die Header der Dependency nicht
+    return Response(content=CatalogService.get_body(db, as_of), media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+# Delta-Sync: Artikel und Varianten, die seit dem Cursor (change_cursor aus GET /catalog/ bzw. cursor der
+# letzten Antwort) angelegt oder deaktiviert wurden. Kategorien und Sortierungen sind klein und werden
+# per ETag (304) abgeglichen.
+@router.get("/changes", response_model=CatalogChangesDTO)
+def get_catalog_changes(since: int = Query(..., ge=0), db: Session = Depends(get_db)):
+    return CatalogService.get_changes(db, since)
+
+# Server-Sent Events: "hello" beim Verbinden, danach ein "changes"-Event je Katalog-Commit.
+# Das etag im Event entspricht dem ETag von GET /catalog/ nach der Änderung. Weicht das etag aus "hello"
+# vom zuletzt geladenen Katalog ab (Verbindungsabbruch, Neustart) oder kommt "resync", lädt der Client neu.
+@router.get("/events")
+async def get_catalog_events():
+    return StreamingResponse(_event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def _event_stream():
+    queue = CatalogEvents.subscribe()
+    try:
+        version = CatalogVersion.current()
+        yield _sse("hello", {"type": "hello", "version": version, "changes": []}, version)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _sse(event["type"], event, event["version"])
+    finally:
+        CatalogEvents.unsubscribe(queue)
+
+def _sse(name: str, event: dict, version: int) -> str:
+    data = json.dumps({**event, "etag": ETag.catalog_tag(version)}, ensure_ascii=False, default=str)
+    return f"id: {version}\nevent: {name}\ndata: {data}\n\n"
+
+# Import einer ganzen Speisekarte als JSON (CatalogImportDTO) oder CSV (Content-Type text/csv, eine Zeile je Variante).
+# Alles oder nichts: ein Fehler in einer Zeile bricht den Import ohne Schreibzugriff ab.
+@router.post("/import", status_code=201, response_model=CatalogImportResultDTO)
+async def import_catalog(request: Request, db: Session = Depends(get_db)):
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        categories = CatalogImportService.parse_csv(body)
+    else:
+        try:
+            categories = CatalogImportDTO.model_validate_json(body).model_dump()["categories"]
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    return await run_in_threadpool(CatalogImportService.import_catalog, db, categories)
+
+@router.get("/cache", response_model=CatalogCacheStatsDTO)
+def get_cache_stats():
+    return CatalogCache.stats()
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 from database import get_db
+import controller.ETag as ETag
 from pydantic import BaseModel, Field
 from typing import List
 import service.CategoryService as CategoryService
@@ -20,11 +21,11 @@ class CategoryUpdateDTO(CategoryCreateDTO):
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
-@router.get("/", response_model=List[CategoryDTO])
+@router.get("/", response_model=List[CategoryDTO], dependencies=[Depends(ETag.catalog)])
 def get_all_categories(db: Session = Depends(get_db)):
     return CategoryService.get_all(db)
 
-@router.get("/{category_id}", response_model=CategoryDTO)
+@router.get("/{category_id}", response_model=CategoryDTO, dependencies=[Depends(ETag.catalog)])
 def get_category_by_id(category_id: int, db: Session = Depends(get_db)):
     return CategoryService.get_by_id(db, category_id)
 
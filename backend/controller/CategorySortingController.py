@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 from database import get_db
+import controller.ETag as ETag
 from pydantic import BaseModel, Field
 from typing import List
 import service.CategorySortingService as CategorySortingService
@@ -15,7 +16,7 @@ class BulkSortingDTO(BaseModel):
 
 router = APIRouter(prefix="/category-sorting", tags=["category-sorting"])
 
-@router.get("/", response_model=List[CategorySortingDTO])
+@router.get("/", response_model=List[CategorySortingDTO], dependencies=[Depends(ETag.catalog)])
 def get_all_sortings(db: Session = Depends(get_db)):
     return CategorySortingService.get_all_sortings(db)
 
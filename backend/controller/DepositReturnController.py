@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 from database import get_db
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import service.DepositReturnService as DepositReturnService
-from datetime import date
+from service.TimeRange import DateOrTime
+from datetime import datetime
 
 class DepositReturnDTO(BaseModel):
     id: int
@@ -12,7 +13,7 @@ class DepositReturnDTO(BaseModel):
     quantity: int
     deposit_amount_per_item: float
     total_amount: float
-    created_at: date
+    created_at: datetime
     model_config = {"from_attributes": True}
 
 class DepositReturnCreateDTO(BaseModel):
@@ -22,8 +23,8 @@ class DepositReturnCreateDTO(BaseModel):
 router = APIRouter(prefix="/deposit-returns", tags=["Deposit Returns"])
 
 @router.get("/", response_model=List[DepositReturnDTO])
-def get_all_deposit_returns(db: Session = Depends(get_db)):
-    return DepositReturnService.get_all(db)
+def get_all_deposit_returns(date_from: Optional[DateOrTime] = None, date_to: Optional[DateOrTime] = None, db: Session = Depends(get_db)):
+    return DepositReturnService.get_all(db, date_from, date_to)
 
 @router.get("/{deposit_return_id}", response_model=DepositReturnDTO)
 def get_deposit_return_by_id(deposit_return_id: int, db: Session = Depends(get_db)):
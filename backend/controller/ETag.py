@@ -0,0 +1,36 @@
+import uuid
+from fastapi import HTTPException, Request, Response
+import service.CatalogVersion as CatalogVersion
+import service.BillVersion as BillVersion
+
+# Starke ETags für GET-Endpunkte, abgeleitet aus den Versionszählern statt aus dem Antwortinhalt.
+# Als Dependency eingebunden läuft die Prüfung vor dem Endpunkt: bei passendem If-None-Match
+# gibt es 304 ohne Service-Query und ohne Serialisierung.
+# Die Zähler starten bei jedem Prozessstart neu, BOOT_ID verhindert Kollisionen mit ETags eines früheren Laufs.
+
+BOOT_ID = uuid.uuid4().hex[:12]
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header: return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or "W/" + etag in tags
+
+def _check(request: Request, response: Response, etag: str) -> str:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _matches(request, etag): raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return etag
+
+def catalog_tag(version: int = None) -> str:
+    return f'"{BOOT_ID}-c{CatalogVersion.current() if version is None else version}"'
+
+def catalog(request: Request, response: Response) -> str:
+    return _check(request, response, catalog_tag())
+
+def bills(request: Request, response: Response) -> str:
+    return _check(request, response, f'"{BOOT_ID}-b{BillVersion.current()}"')
+
+def bills_and_catalog(request: Request, response: Response) -> str:
+    # Für Auswertungen, die Rechnungen mit Katalogdaten (Namen, Kategorien) verbinden
+    return _check(request, response, f'"{BOOT_ID}-b{BillVersion.current()}-c{CatalogVersion.current()}"')
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from database import get_db
+import controller.ETag as ETag
 import service.ItemVariantService as ItemVariantService
 
 class ItemVariantDTO(BaseModel):
@@ -28,33 +29,39 @@ class ItemVariantUpdateDTO(BaseModel):
 
 router = APIRouter(prefix="/item-variants", tags=["Item Variants"])
 
-@router.get("/stock-item/{stock_item_id}", response_model=List[ItemVariantDTO])
+def _to_dto(variant) -> ItemVariantDTO:
+    # Ersatzname erst beim Serialisieren, Rows bzw. ORM-Objekte bleiben unverändert
+    return ItemVariantDTO(id=variant.id, stock_item_id=variant.stock_item_id, name=ItemVariantService.display_name(variant),
+                          price=variant.price, bill_steps=variant.bill_steps, is_active=variant.is_active, version=variant.version)
+
+@router.get("/stock-item/{stock_item_id}", response_model=List[ItemVariantDTO], dependencies=[Depends(ETag.catalog)])
 def get_all_in_stock_item(stock_item_id: int, db: Session = Depends(get_db)):
-    return ItemVariantService.get_all_in_stock_item(db, stock_item_id)
+    variants = ItemVariantService.get_all_in_stock_item(db, stock_item_id)
+    return [_to_dto(v) for v in variants]
 
-@router.get("/{variant_id}", response_model=ItemVariantDTO)
+@router.get("/{variant_id}", response_model=ItemVariantDTO, dependencies=[Depends(ETag.catalog)])
 def get_by_id(variant_id: int, db: Session = Depends(get_db)):
-    return ItemVariantService.get_by_id(db, variant_id)
+    return _to_dto(ItemVariantService.get_by_id(db, variant_id))
 
 @router.post("/", response_model=ItemVariantDTO, status_code=status.HTTP_201_CREATED)
 def create(variant: ItemVariantCreateDTO, db: Session = Depends(get_db)):
-    return ItemVariantService.create(
+    return _to_dto(ItemVariantService.create(
         db,
         stock_item_id=variant.stock_item_id,
         name=variant.name,
         price=variant.price,
         bill_steps=variant.bill_steps
-    )
+    ))
 
 @router.put("/{variant_id}", response_model=ItemVariantDTO)
 def update(variant_id: int, variant: ItemVariantUpdateDTO, db: Session = Depends(get_db)):
-    return ItemVariantService.update(
+    return _to_dto(ItemVariantService.update(
         db,
         variant_id=variant_id,
         name=variant.name,
         price=variant.price,
         bill_steps=variant.bill_steps
-    )
+    ))
 
 @router.delete("/{variant_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete(variant_id: int, db: Session = Depends(get_db)):
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 from database import get_db
+import controller.ETag as ETag
 from pydantic import BaseModel, Field, model_validator
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 import service.StockItemService as StockItemService
 import service.ItemVariantService as ItemVariantService
 
@@ -50,20 +52,30 @@ class StockItemBulkUpdateDTO(StockItemUpdateDTO):
 
 router = APIRouter(prefix="/stock-items", tags=["Stock Items"])
 
-@router.get("/", response_model=List[StockItemDTO])
-def get_all(db: Session = Depends(get_db)):
-    items = StockItemService.get_all(db)
-    for item in items:
-        variants = ItemVariantService.get_all_in_stock_item(db, item.id)
-        item.item_variants = variants
-    return items
+def _with_active_variants(db: Session, items, as_of: datetime = None) -> List[StockItemDTO]:
+    # DTOs statt ORM-Objekte befüllen: eine Query für alle Varianten, die Session bleibt unverändert
+    variants = ItemVariantService.get_active_by_stock_items(db, [item.id for item in items], as_of)
+    return [StockItemDTO(
+        id=item.id,
+        name=item.name,
+        category_id=item.category_id,
+        deposit_amount=item.deposit_amount,
+        is_active=item.is_active,
+        item_variants=[_variant_dto(v) for v in variants[item.id]],
+    ) for item in items]
 
-@router.get("/{item_id}", response_model=StockItemDTO)
+def _variant_dto(variant) -> ItemVariantDTO:
+    # Ersatzname erst hier beim Serialisieren, Rows bzw. ORM-Objekte bleiben unverändert
+    return ItemVariantDTO(id=variant.id, name=ItemVariantService.display_name(variant), price=variant.price, bill_steps=variant.bill_steps)
+
+@router.get("/", response_model=List[StockItemDTO], dependencies=[Depends(ETag.catalog)])
+def get_all(as_of: Optional[datetime] = None, db: Session = Depends(get_db)):
+    # as_of: die Artikel, wie sie zu diesem Zeitpunkt galten (z.B. date einer Rechnung)
+    return _with_active_variants(db, StockItemService.get_all(db, as_of), as_of)
+
+@router.get("/{item_id}", response_model=StockItemDTO, dependencies=[Depends(ETag.catalog)])
 def get_by_id(item_id: int, db: Session = Depends(get_db)):
-    item = StockItemService.get_by_id(db, item_id)
-    variants = ItemVariantService.get_all_in_stock_item(db, item_id)
-    item.item_variants = variants
-    return item
+    return _with_active_variants(db, [StockItemService.get_by_id(db, item_id)])[0]
 
 @router.post("/", response_model=StockItemDTO, status_code=status.HTTP_201_CREATED)
 def create(item: StockItemCreateDTO, db: Session = Depends(get_db)):
@@ -77,46 +89,29 @@ def create(item: StockItemCreateDTO, db: Session = Depends(get_db)):
             price=variant.price,
             bill_steps=variant.bill_steps
         ))
-    stock_item.item_variants = variants
-    return stock_item
+    return StockItemDTO(
+        id=stock_item.id,
+        name=stock_item.name,
+        category_id=stock_item.category_id,
+        deposit_amount=stock_item.deposit_amount,
+        is_active=stock_item.is_active,
+        item_variants=[_variant_dto(v) for v in variants],
+    )
 
 @router.put("/bulk", response_model=List[StockItemDTO])
 def bulk_update(items: List[StockItemBulkUpdateDTO], db: Session = Depends(get_db)):
-    return StockItemService.bulk_update(db, [item.model_dump() for item in items])
+    return _with_active_variants(db, StockItemService.bulk_update(db, [item.model_dump() for item in items]))
 
 @router.put("/{item_id}", response_model=StockItemDTO)
 def update(item_id: int, item: StockItemUpdateDTO, db: Session = Depends(get_db)):
-    new_stock_item = StockItemService.update(db, item_id, item.name, item.category_id, item.deposit_amount)
-    new_variants = []
-    for variant in item.item_variants:
-        # Check if this is an existing variant (positive ID) or a new one (negative or None)
-        if variant.id and variant.id > 0:
-            new_variant = ItemVariantService.update(
-                db,
-                variant_id=variant.id,
-                name=variant.name,
-                price=variant.price,
-                bill_steps=variant.bill_steps,
-                stock_item_id=new_stock_item.id
-            )
-        else:
-            # This is a new variant (id is -1, None, or <= 0)
-            new_variant = ItemVariantService.create(
-                db,
-                stock_item_id=new_stock_item.id,
-                name=variant.name,
-                price=variant.price,
-                bill_steps=variant.bill_steps
-            )
-        new_variants.append(new_variant)
-    new_stock_item.item_variants = new_variants
-    return new_stock_item
-
-@router.get("/category/{category_id}", response_model=List[StockItemDTO])
+    # Varianten mit positiver ID werden übernommen, ohne ID (oder -1) neu angelegt
+    new_stock_item = StockItemService.update_with_variants(
+        db, item_id, item.name, item.category_id, item.deposit_amount, [variant.model_dump() for variant in item.item_variants])
+    return _with_active_variants(db, [new_stock_item])[0]
+
+@router.get("/category/{category_id}", response_model=List[StockItemDTO], dependencies=[Depends(ETag.catalog)])
 def get_all_in_category(category_id: int, db: Session = Depends(get_db)):
-    items = StockItemService.get_all_in_category(db, category_id)
-    for item in items: item.item_variants = ItemVariantService.get_all_in_stock_item(db, item.id)
-    return items
+    return _with_active_variants(db, StockItemService.get_all_in_category(db, category_id))
 
 @router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete(item_id: int, db: Session = Depends(get_db)):
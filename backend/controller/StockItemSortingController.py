@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 from typing import List
 from database import get_db
+import controller.ETag as ETag
 from pydantic import BaseModel, Field
 import service.StockItemSortingService as StockItemSortingService
 
@@ -14,7 +15,7 @@ class BulkSortingUpdateDTO(BaseModel):
 
 router = APIRouter(prefix="/item-sorting", tags=["Item Sorting"])
 
-@router.get("/", response_model=List[ItemSortingDTO])
+@router.get("/", response_model=List[ItemSortingDTO], dependencies=[Depends(ETag.catalog)])
 def get_all_sortings(db: Session = Depends(get_db)):
     sortings = StockItemSortingService.get_all_sortings(db)
     return [ItemSortingDTO(item_id=s.item_id, sort_order=s.sort_order) for s in sortings]
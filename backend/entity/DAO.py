@@ -1,7 +1,12 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, Boolean, Index, Sequence, func
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
+
+# Monoton steigender Änderungszähler für StockItem/ItemVariant (Delta-Sync, GET /catalog/changes).
+# Neue Zeilen bekommen ihn per Default, geänderte Zeilen (z.B. deaktiviert) in CatalogVersion vor dem Flush.
+CATALOG_CHANGE_SEQ = Sequence("catalog_change_seq", metadata=Base.metadata)
+
 class Category(Base):
     __tablename__ = 'category'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -26,10 +31,37 @@ class StockItem(Base):
     deposit_amount = Column(Float, default=0.0, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False, server_default="true")
     version = Column(Integer)
+    change_seq = Column(BigInteger, CATALOG_CHANGE_SEQ, server_default=CATALOG_CHANGE_SEQ.next_value())
+    # Gültigkeit der Version [valid_from, valid_to), valid_to NULL = aktuell; gesetzt in CatalogVersion
+    valid_from = Column(DateTime, nullable=False, server_default=func.localtimestamp())
+    valid_to = Column(DateTime)
 
     category = relationship("Category", back_populates="stock_items")
     item_variants = relationship("ItemVariant", back_populates="stock_item")
 
+    # Jede Bearbeitung legt eine neue Version an, die alte bleibt inaktiv liegen: die Lesepfade sehen nur die aktiven Zeilen
+    __table_args__ = (
+        Index("ix_stock_item_live_id", "id", postgresql_where=is_active),
+        # Eindeutiger Name je Kategorie unter den aktiven Artikeln, dient zugleich der Kategorieliste
+        Index("ux_stock_item_live_category", "category_id", "name", unique=True, postgresql_where=is_active),
+        Index("ix_stock_item_base_item_id", "base_item_id"),
+        # Alle Versionen eines Artikels (das Original hat base_item_id NULL) mit einer Index-Suche
+        Index("ix_stock_item_lineage", func.coalesce(base_item_id, id)),
+        Index("ix_stock_item_change_seq", "change_seq"),
+        # Versionen, die zu einem Zeitpunkt gültig waren (as_of): tsrange(valid_from, valid_to) @> Zeitpunkt
+        Index("ix_stock_item_validity", func.tsrange(valid_from, valid_to), postgresql_using="gist"),
+    )
+
+class StockItemHead(Base):
+    # Aktuelle Version je Artikel (base_item_id = ID des Originals), gepflegt von StockItemHeadService
+    # in derselben Transaktion wie die Versionierung
+    __tablename__ = 'stock_item_head'
+    base_item_id = Column(Integer, ForeignKey('stock_item.id'), primary_key=True)
+    current_item_id = Column(Integer, ForeignKey('stock_item.id'), nullable=False)
+    version = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_stock_item_head_current_item_id", "current_item_id"),)
+
 class ItemSorting(Base):
     __tablename__ = "item_sorting"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -46,17 +78,41 @@ class ItemVariant(Base):
     bill_steps = Column(Float)
     is_active = Column(Boolean, default=True, nullable=False, server_default="true")
     version = Column(Integer)
+    change_seq = Column(BigInteger, CATALOG_CHANGE_SEQ, server_default=CATALOG_CHANGE_SEQ.next_value())
+    valid_from = Column(DateTime, nullable=False, server_default=func.localtimestamp())
+    valid_to = Column(DateTime)
 
     stock_item = relationship("StockItem", back_populates="item_variants")
 
+    __table_args__ = (
+        Index("ix_item_variant_stock_item_id", "stock_item_id"),
+        Index("ix_item_variant_live_stock_item_id", "stock_item_id", postgresql_where=is_active),
+        # Aktive Varianten eines Artikels: nicht zweimal gleicher Name mit gleichem Preis bzw. gleichem Rechenschritt
+        Index("ux_item_variant_live_price", "stock_item_id", func.coalesce(name, ""), "price", unique=True, postgresql_where=is_active),
+        Index("ux_item_variant_live_steps", "stock_item_id", func.coalesce(name, ""), "bill_steps", unique=True, postgresql_where=is_active),
+        Index("ix_item_variant_change_seq", "change_seq"),
+        Index("ix_item_variant_validity", func.tsrange(valid_from, valid_to), postgresql_using="gist"),
+    )
+
 class Bill(Base):
     __tablename__ = 'bill'
     id = Column(Integer, primary_key=True, autoincrement=True)
-    date = Column(Date)
+    date = Column(DateTime)
     is_deleted = Column(Boolean, default=False, nullable=False)
+    # Beim Kassieren berechnet: Warenwert ohne Pfand bzw. Pfandsumme (NULL bei Altdaten)
+    total_amount = Column(Float)
+    deposit_total = Column(Float)
+    # Vom Terminal vergebene ID (UUID/ULID) für den Batch-Upload, macht Wiederholungen idempotent
+    client_id = Column(String(36))
 
     items = relationship("BillItem", back_populates="bill")
 
+    __table_args__ = (
+        Index("ix_bill_date_id", "date", "id"),
+        Index("ix_bill_live_date_id", "date", "id", postgresql_where=~is_deleted),
+        Index("ux_bill_client_id", "client_id", unique=True),
+    )
+
 class BillItem(Base):
     __tablename__ = 'bill_item'
     bill_id = Column(Integer, ForeignKey('bill.id'))
@@ -64,9 +120,24 @@ class BillItem(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     item_quantity = Column(Float)
+    # Momentaufnahme beim Kassieren, damit Summen und Belege nicht von item_variant abhängen (NULL bei Altdaten)
+    item_price = Column(Float)
+    item_deposit_amount = Column(Float)
+    item_name = Column(String(101))
 
     bill = relationship("Bill", back_populates="items")
 
+    __table_args__ = (Index("ix_bill_item_bill_id", "bill_id"),)
+
+class SalesDailyRollup(Base):
+    # Tagessummen je Variante, werden von BillService.create/delete in derselben Transaktion gepflegt
+    __tablename__ = 'sales_daily_rollup'
+    day = Column(Date, primary_key=True)
+    stock_item_id = Column(Integer, ForeignKey('stock_item.id'), primary_key=True)
+    item_variant_id = Column(Integer, ForeignKey('item_variant.id'), primary_key=True)
+    quantity = Column(Float, nullable=False, default=0.0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
 class DepositReturn(Base):
     __tablename__ = 'deposit_return'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -74,6 +145,12 @@ class DepositReturn(Base):
     quantity = Column(Integer, nullable=False)
     deposit_amount_per_item = Column(Float, nullable=False)
     total_amount = Column(Float, nullable=False)
-    created_at = Column(Date, nullable=False)
+    created_at = Column(DateTime, nullable=False)
     
-    stock_item = relationship("StockItem")
\ No newline at end of file
+    stock_item = relationship("StockItem")
+
+    # BRIN passt zu append-only Zeitdaten: winziger Index, Bereichsabfragen lesen nur die betroffenen Blöcke
+    __table_args__ = (
+        Index("ix_deposit_return_created_at", "created_at", postgresql_using="brin"),
+        Index("ix_deposit_return_stock_item_id", "stock_item_id"),
+    )
\ No newline at end of file
@@ -0,0 +1,11 @@
+# Baut die Tagessummen (sales_daily_rollup) aus allen nicht gelöschten Rechnungen neu auf.
+# Aufruf (aus backend/): python rebuild_sales_rollup.py
+from database import SessionLocal
+import service.SalesRollupService as SalesRollupService
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        SalesRollupService.rebuild(db)
+    finally:
+        db.close()
@@ -0,0 +1,11 @@
+# Baut die Kopfzeiger der Artikelversionen (stock_item_head) aus stock_item neu auf.
+# Aufruf (aus backend/): python rebuild_stock_item_heads.py
+from database import SessionLocal
+import service.StockItemHeadService as StockItemHeadService
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        StockItemHeadService.rebuild(db)
+    finally:
+        db.close()
@@ -0,0 +1,135 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from service import BillService
+
+# Optionaler Write-Behind-Modus für POST /bills/ (BILL_INGEST_MODE=queued):
+# Der Request validiert die Rechnung, bekommt eine ID aus einem vorab reservierten Sequenzblock und legt sie
+# in eine Queue. Ein Hintergrund-Thread schreibt alle Rechnungen, die sich innerhalb von flush_interval_ms
+# angesammelt haben, mit Multi-Row-INSERTs und einem gemeinsamen Commit.
+#
+# Durability:
+#   "commit"       Request wartet, bis seine Gruppe committet ist (Standard, keine verlorenen Rechnungen)
+#   "async_commit" wie "commit", aber mit synchronous_commit=off; ein DB-Absturz kann die letzten
+#                  Millisekunden verlieren, die Datenbank bleibt konsistent
+#   "enqueue"      Request kehrt direkt nach dem Einreihen zurück; ein Absturz des Backends verliert
+#                  alle noch nicht geschriebenen Rechnungen
+#
+# Die ID-Reservierung und die Queue sind prozesslokal, der Modus ist für einen einzelnen Worker gedacht.
+
+DURABILITY_MODES = ("commit", "async_commit", "enqueue")
+
+logger = logging.getLogger(__name__)
+
+_queue = None
+_flusher = None
+_stopping = threading.Event()
+_submit_lock = threading.Lock()
+_config = {}
+_id_lock = threading.Lock()
+_id_block = []
+
+def is_running() -> bool:
+    return _flusher is not None
+
+def start(session_factory, flush_interval_ms: float = 5, durability: str = "commit", id_block_size: int = 100, max_batch: int = 500):
+    global _queue, _flusher
+    if durability not in DURABILITY_MODES: raise ValueError(f"Unbekannter Durability-Modus: {durability}")
+    if _flusher is not None: raise RuntimeError("BillIngestQueue läuft bereits")
+    _config.update(
+        session_factory=session_factory,
+        flush_interval=flush_interval_ms / 1000,
+        durability=durability,
+        id_block_size=id_block_size,
+        max_batch=max_batch,
+    )
+    _id_block.clear()
+    _stopping.clear()
+    _queue = queue.Queue()
+    _flusher = threading.Thread(target=_run, name="bill-ingest-flusher", daemon=True)
+    _flusher.start()
+
+def stop():
+    # Schreibt alle noch wartenden Rechnungen und beendet den Flusher. Unter _submit_lock gesetzt, damit nach
+    # _stopping nichts mehr eingereiht wird, das der Flusher nicht mehr liest.
+    global _flusher
+    if _flusher is None: return
+    with _submit_lock: _stopping.set()
+    _flusher.join()
+    _flusher = None
+    # Sollte trotzdem etwas liegen geblieben sein: nicht ewig warten lassen
+    while not _queue.empty():
+        bill = _queue.get_nowait()
+        logger.error("Rechnung %s wurde beim Beenden nicht geschrieben", bill["id"])
+        bill["future"].set_exception(RuntimeError("Rechnungsannahme wurde beendet"))
+
+def submit(db: Session, bill_date: datetime, items: list[dict]) -> dict:
+    variants = BillService.validate_items(db, items)
+    with _submit_lock:
+        if _stopping.is_set(): raise HTTPException(status_code=503, detail="Rechnungsannahme wird beendet")
+        bill = {"id": _next_id(db), "date": bill_date, "items": items, "variants": variants, "future": Future()}
+        _queue.put(bill)
+    # Verbindung vor dem Warten zurück in den Pool: der Flusher holt seine aus demselben Pool, wartende
+    # Requests dürfen ihn nicht leer halten. Die reservierten IDs stammen aus der Sequenz und bleiben gültig.
+    db.close()
+    if _config["durability"] != "enqueue":
+        try:
+            bill["future"].result()
+        except Exception as e:
+            raise HTTPException(status_code=400, detail="Fehler bei der Erstellung der Rechnung: " + str(e))
+    return bill
+
+def _next_id(db: Session) -> int:
+    with _id_lock:
+        if not _id_block: _id_block.extend(BillService.allocate_ids(db, _config["id_block_size"]))
+        return _id_block.pop(0)
+
+def _run():
+    while not (_stopping.is_set() and _queue.empty()):
+        try:
+            first = _queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        batch = [first]
+        deadline = time.monotonic() + _config["flush_interval"]
+        while len(batch) < _config["max_batch"]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            try:
+                batch.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _flush(batch)
+
+def _flush(batch: list[dict]):
+    try:
+        _write(batch)
+    except Exception:
+        # Gruppe einzeln wiederholen, damit eine fehlerhafte Rechnung nicht die ganze Gruppe verwirft
+        for bill in batch:
+            try:
+                _write([bill])
+            except Exception as e:
+                logger.exception("Rechnung %s konnte nicht geschrieben werden", bill["id"])
+                bill["future"].set_exception(e)
+                continue
+            bill["future"].set_result(bill["id"])
+        return
+    for bill in batch: bill["future"].set_result(bill["id"])
+
+def _write(batch: list[dict]):
+    db = _config["session_factory"]()
+    try:
+        if _config["durability"] == "async_commit": db.execute(text("SET LOCAL synchronous_commit TO OFF"))
+        BillService.write_prepared(db, batch)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
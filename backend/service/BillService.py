@@ -1,53 +1,226 @@
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import IntegrityError
-from entity.DAO import Bill, BillItem, ItemVariant, StockItem
-from datetime import date
+from entity.DAO import Bill, BillItem, ItemVariant, StockItem, Category, SalesDailyRollup
+from datetime import date, datetime
+import service.SalesRollupService as SalesRollupService
+import service.BillVersion as BillVersion
+import service.TimeRange as TimeRange
+from service.TimeRange import DateOrTime
 
-def get_all(db: Session):
-    return db.query(Bill).filter(Bill.is_deleted == False).order_by(Bill.date.desc()).all()
+def _encode_cursor(bill: Bill) -> str:
+    return f"{bill.date.isoformat()}_{bill.id}"
+
+def _decode_cursor(cursor: str):
+    try:
+        bill_date, bill_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(bill_date), int(bill_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ungültiger Cursor")
+
+def _paginate(query, limit: int = None, cursor: str = None, date_from: DateOrTime = None, date_to: DateOrTime = None):
+    # Keyset-Pagination über (date, id) absteigend, damit jede Seite über den Index ix_bill_date_id gelesen wird
+    query = TimeRange.apply(query, Bill.date, date_from, date_to)
+    if cursor is not None: query = query.filter(tuple_(Bill.date, Bill.id) < _decode_cursor(cursor))
+    query = query.order_by(Bill.date.desc(), Bill.id.desc())
+    if limit is None: return query.all(), None
+    bills = query.limit(limit + 1).all()
+    if len(bills) <= limit: return bills, None
+    bills = bills[:limit]
+    return bills, _encode_cursor(bills[-1])
+
+def get_all(db: Session, limit: int = None, cursor: str = None, date_from: DateOrTime = None, date_to: DateOrTime = None):
+    return _paginate(db.query(Bill).options(selectinload(Bill.items)).filter(Bill.is_deleted == False), limit, cursor, date_from, date_to)
 
 def get_by_id(db: Session, bill_id: int):
-    bill = db.query(Bill).filter(Bill.id == bill_id, Bill.is_deleted == False).first()
+    bill = db.query(Bill).options(selectinload(Bill.items)).filter(Bill.id == bill_id, Bill.is_deleted == False).first()
     if not bill:
         raise HTTPException(status_code=404, detail="Rechnung nicht gefunden")
     return bill
 
-def get_all_with_deleted(db: Session):
-    return db.query(Bill).order_by(Bill.date.desc()).all()
+def get_all_with_deleted(db: Session, limit: int = None, cursor: str = None, date_from: DateOrTime = None, date_to: DateOrTime = None, is_deleted: bool = None):
+    query = db.query(Bill).options(selectinload(Bill.items))
+    if is_deleted is not None: query = query.filter(Bill.is_deleted == is_deleted)
+    return _paginate(query, limit, cursor, date_from, date_to)
+
+def get_stats(db: Session, date_from: DateOrTime = None, date_to: DateOrTime = None, include_deleted: bool = False) -> list[dict]:
+    # Aggregation komplett in SQL: eine Zeile pro Variante, inkl. Artikel und Kategorie
+    if include_deleted or not TimeRange.is_whole_days(date_from, date_to):
+        # Gelöschte Rechnungen und Bereiche mit Uhrzeit lassen sich nicht aus den Tagessummen beantworten,
+        # daher direkt über bill_item
+        quantity = func.sum(BillItem.item_quantity)
+        revenue = func.sum(BillItem.item_quantity * func.coalesce(BillItem.item_price, ItemVariant.price))
+        query = (db.query(*_stats_columns(quantity, revenue))
+                 .select_from(BillItem)
+                 .join(Bill, Bill.id == BillItem.bill_id)
+                 .join(ItemVariant, ItemVariant.id == BillItem.item_variant_id))
+        if not include_deleted: query = query.filter(Bill.is_deleted == False)
+        query = TimeRange.apply(query, Bill.date, date_from, date_to)
+    else:
+        quantity = func.sum(SalesDailyRollup.quantity)
+        revenue = func.sum(SalesDailyRollup.revenue)
+        query = (db.query(*_stats_columns(quantity, revenue))
+                 .select_from(SalesDailyRollup)
+                 .join(ItemVariant, ItemVariant.id == SalesDailyRollup.item_variant_id))
+        if date_from is not None: query = query.filter(SalesDailyRollup.day >= date_from)
+        if date_to is not None: query = query.filter(SalesDailyRollup.day <= date_to)
+    query = (query
+             .join(StockItem, StockItem.id == ItemVariant.stock_item_id)
+             .join(Category, Category.id == StockItem.category_id)
+             .group_by(Category.id, Category.name, StockItem.id, StockItem.name, ItemVariant.id, ItemVariant.name, ItemVariant.bill_steps)
+             .having(quantity > 0)
+             .order_by(quantity.desc(), ItemVariant.id))
+    stats = []
+    for row in query.all():
+        stat = row._asdict()
+        if stat["variant_name"] is None or stat["variant_name"].strip() == "": stat["variant_name"] = str(stat["bill_steps"])
+        stats.append(stat)
+    return stats
+
+EXPORT_COLUMNS = ["bill_id", "date", "is_deleted", "category", "stock_item", "variant", "item_quantity", "price", "deposit_amount", "revenue"]
+
+def iter_export_rows(db: Session, date_from: DateOrTime = None, date_to: DateOrTime = None, include_deleted: bool = False):
+    # Eine Zeile pro Rechnungsposition; yield_per liest über einen serverseitigen Cursor in Blöcken,
+    # sodass nie die komplette Historie im Speicher liegt
+    stmt = (select(
+                Bill.id.label("bill_id"),
+                Bill.date.label("date"),
+                Bill.is_deleted.label("is_deleted"),
+                Category.name.label("category"),
+                StockItem.name.label("stock_item"),
+                ItemVariant.name.label("variant"),
+                ItemVariant.bill_steps.label("bill_steps"),
+                BillItem.item_quantity.label("item_quantity"),
+                func.coalesce(BillItem.item_price, ItemVariant.price).label("price"),
+                func.coalesce(BillItem.item_deposit_amount, StockItem.deposit_amount).label("deposit_amount"))
+            .select_from(BillItem)
+            .join(Bill, Bill.id == BillItem.bill_id)
+            .join(ItemVariant, ItemVariant.id == BillItem.item_variant_id)
+            .join(StockItem, StockItem.id == ItemVariant.stock_item_id)
+            .join(Category, Category.id == StockItem.category_id))
+    if not include_deleted: stmt = stmt.where(Bill.is_deleted == False)
+    stmt = TimeRange.apply(stmt, Bill.date, date_from, date_to)
+    stmt = stmt.order_by(Bill.date, Bill.id, BillItem.id).execution_options(yield_per=1000)
+    for row in db.execute(stmt):
+        export_row = row._asdict()
+        if export_row["variant"] is None or export_row["variant"].strip() == "": export_row["variant"] = str(export_row["bill_steps"])
+        export_row["revenue"] = (export_row["price"] or 0.0) * export_row["item_quantity"]
+        yield export_row
 
-def create(db: Session, bill_date: date, items: list[dict]):
+def _stats_columns(quantity, revenue):
+    return (
+        Category.id.label("category_id"),
+        Category.name.label("category_name"),
+        StockItem.id.label("stock_item_id"),
+        StockItem.name.label("stock_item_name"),
+        ItemVariant.id.label("item_variant_id"),
+        ItemVariant.name.label("variant_name"),
+        ItemVariant.bill_steps.label("bill_steps"),
+        quantity.label("quantity"),
+        revenue.label("revenue"),
+    )
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+def validate_items(db: Session, items: list[dict]) -> dict:
+    # Validierung komplett vor dem ersten Schreibzugriff: alle Varianten-IDs in einer Abfrage prüfen.
+    # Liefert je Varianten-ID die Daten für die Momentaufnahme auf der Rechnungsposition.
     if not items or not isinstance(items, list): 
         raise HTTPException(status_code=400, detail="Items müssen eine Liste sein und dürfen nicht leer sein")
-    
-    # Erstelle Bill
-    bill = Bill(date=bill_date)
+    for item in items:
+        if item.get("item_quantity", 1) <= 0:
+            raise HTTPException(status_code=400, detail="Item quantity must be greater than 0")
+    variant_ids = {item["item_variant_id"] for item in items}
+    variants = {
+        row.id: row for row in
+        db.query(
+            ItemVariant.id, ItemVariant.stock_item_id, ItemVariant.price, ItemVariant.name,
+            StockItem.name.label("stock_item_name"), StockItem.deposit_amount)
+        .join(StockItem, StockItem.id == ItemVariant.stock_item_id)
+        .filter(ItemVariant.id.in_(variant_ids))
+    }
+    missing = variant_ids - variants.keys()
+    if missing:
+        raise HTTPException(status_code=400, detail=f"ItemVariant {sorted(missing)} nicht gefunden")
+    return variants
+
+def _display_name(variant) -> str:
+    if variant.name is None or variant.name.strip() == "": return variant.stock_item_name
+    return f"{variant.stock_item_name} {variant.name}"
+
+def build_lines(bill: dict) -> list[dict]:
+    # Rechnungspositionen inkl. Momentaufnahme von Preis, Pfand und Anzeigename.
+    # Die Rechnung braucht id, items und variants (aus validate_items).
+    lines = []
+    for item in bill["items"]:
+        variant = bill["variants"][item["item_variant_id"]]
+        lines.append({
+            "bill_id": bill["id"],
+            "item_variant_id": item["item_variant_id"],
+            "item_quantity": item.get("item_quantity", 1),
+            "item_price": variant.price or 0.0,
+            "item_deposit_amount": variant.deposit_amount or 0.0,
+            "item_name": _display_name(variant),
+        })
+    return lines
+
+def compute_totals(bill: dict) -> tuple[float, float]:
+    # Warenwert und Pfandsumme einer Rechnung aus der Momentaufnahme ihrer Positionen
+    lines = build_lines(bill)
+    return (
+        sum(line["item_price"] * line["item_quantity"] for line in lines),
+        sum(line["item_deposit_amount"] * line["item_quantity"] for line in lines),
+    )
+
+def write_lines(db: Session, bills: list[dict]):
+    # Schreibt die BillItems mehrerer Rechnungen als ein Multi-Row-INSERT und pflegt die Tagessummen.
+    # Jede Rechnung braucht id, date, items und variants (aus validate_items); committet nicht selbst.
+    rollup_lines = []
+    bill_items = []
+    for bill in bills:
+        for line in build_lines(bill):
+            bill_items.append(line)
+            rollup_lines.append({
+                "day": _day(bill["date"]),
+                "stock_item_id": bill["variants"][line["item_variant_id"]].stock_item_id,
+                "item_variant_id": line["item_variant_id"],
+                "item_quantity": line["item_quantity"],
+                "price": line["item_price"],
+            })
+    db.execute(insert(BillItem), bill_items)
+    SalesRollupService.apply(db, rollup_lines)
+
+def write_prepared(db: Session, bills: list[dict]):
+    # Schreibt bereits validierte Rechnungen mit vorab vergebener ID (siehe BillIngestQueue) in einer Transaktion
+    rows = []
+    for bill in bills:
+        total_amount, deposit_total = compute_totals(bill)
+        rows.append({"id": bill["id"], "date": bill["date"], "is_deleted": False, "total_amount": total_amount, "deposit_total": deposit_total})
+    db.execute(insert(Bill), rows)
+    write_lines(db, bills)
+    db.commit()
+    BillVersion.bump()
+
+def allocate_ids(db: Session, count: int) -> list[int]:
+    # Reserviert einen Block von IDs aus der Sequenz der bill-Tabelle
+    return list(db.execute(select(func.nextval("bill_id_seq")).select_from(func.generate_series(1, count))).scalars())
+
+def create(db: Session, bill_date: datetime, items: list[dict]):
+    variants = validate_items(db, items)
+
+    # Bill, alle BillItems und die Tagessummen in einer Transaktion
+    total_amount, deposit_total = compute_totals({"id": None, "items": items, "variants": variants})
+    bill = Bill(date=bill_date, total_amount=total_amount, deposit_total=deposit_total)
     db.add(bill)
-    
     try:
+        db.flush()
+        write_lines(db, [{"id": bill.id, "date": bill_date, "items": items, "variants": variants}])
         db.commit()
-        db.refresh(bill)
-        
-        for item in items:
-            variant = db.query(ItemVariant).filter(ItemVariant.id == item["item_variant_id"]).first()
-            if not variant: 
-                raise HTTPException(status_code=404, detail=f"ItemVariant {item['item_variant_id']} nicht gefunden")
-            
-            quantity = item.get("item_quantity", 1)
-            if quantity <= 0: 
-                raise HTTPException(status_code=400, detail="Item quantity must be greater than 0")
-            
-            bill_item = BillItem(
-                bill_id=bill.id,
-                item_variant_id=item["item_variant_id"],
-                item_quantity=quantity
-            )
-            db.add(bill_item)
-        
-        db.commit()
-        db.refresh(bill)
+        BillVersion.bump()
         return bill
-        
     except IntegrityError as e:
         db.rollback()
         raise HTTPException(status_code=400, detail="Integritätsfehler: " + str(e.orig))
@@ -55,13 +228,79 @@ def create(db: Session, bill_date: date, items: list[dict]):
         db.rollback()
         raise HTTPException(status_code=400, detail="Fehler bei der Erstellung der Rechnung: " + str(e))
 
+def create_batch(db: Session, bills: list[dict]) -> list[dict]:
+    # Nimmt viele Rechnungen (z.B. nach einem Offline-Zeitraum) in einer Transaktion an.
+    # Jede Rechnung braucht client_id, date und items. Bereits bekannte client_ids werden über den
+    # Unique-Index ux_bill_client_id (ON CONFLICT DO NOTHING) übersprungen, ohne vorher zu lesen.
+    if not bills: raise HTTPException(status_code=400, detail="Die Liste darf nicht leer sein")
+    unique_bills, seen = [], set()
+    for bill in bills:
+        if bill["client_id"] in seen: continue
+        seen.add(bill["client_id"])
+        unique_bills.append(bill)
+    for bill in unique_bills:
+        if not bill["items"]: raise HTTPException(status_code=400, detail=f"Rechnung {bill['client_id']}: Items dürfen nicht leer sein")
+    variants = validate_items(db, [item for bill in unique_bills for item in bill["items"]])
+    rows = []
+    for bill in unique_bills:
+        bill["variants"] = variants
+        total_amount, deposit_total = compute_totals({"id": None, **bill})
+        rows.append({
+            "client_id": bill["client_id"], "date": bill["date"], "is_deleted": False,
+            "total_amount": total_amount, "deposit_total": deposit_total
+        })
+    try:
+        stmt = (pg_insert(Bill).values(rows)
+                .on_conflict_do_nothing(index_elements=[Bill.client_id])
+                .returning(Bill.id, Bill.client_id))
+        created = {row.client_id: row.id for row in db.execute(stmt)}
+        new_bills = [bill for bill in unique_bills if bill["client_id"] in created]
+        for bill in new_bills: bill["id"] = created[bill["client_id"]]
+        if new_bills: write_lines(db, new_bills)
+        skipped_ids = [bill["client_id"] for bill in unique_bills if bill["client_id"] not in created]
+        existing = {}
+        if skipped_ids:
+            existing = dict(db.query(Bill.client_id, Bill.id).filter(Bill.client_id.in_(skipped_ids)).all())
+        db.commit()
+        if new_bills: BillVersion.bump()
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Integritätsfehler: " + str(e.orig))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Fehler beim Batch-Upload der Rechnungen: " + str(e))
+    return [
+        {"client_id": bill["client_id"], "id": created.get(bill["client_id"], existing.get(bill["client_id"])), "created": bill["client_id"] in created}
+        for bill in unique_bills
+    ]
+
 def delete(db: Session, bill_id: int):
-    bill = db.query(Bill).filter(Bill.id == bill_id).first()
+    # Zeilensperre: zwei gleichzeitige Löschungen derselben Rechnung dürfen die Tagessummen nur einmal abziehen,
+    # die zweite wartet und sieht danach is_deleted
+    bill = db.query(Bill).filter(Bill.id == bill_id).with_for_update().first()
     if not bill:
         raise HTTPException(status_code=404, detail="Rechnung nicht gefunden")
+    if bill.is_deleted:
+        db.rollback()
+        return
     bill.is_deleted = True
+    lines = (db.query(BillItem.item_variant_id, BillItem.item_quantity, ItemVariant.stock_item_id, func.coalesce(BillItem.item_price, ItemVariant.price).label("price"))
+             .join(ItemVariant, ItemVariant.id == BillItem.item_variant_id)
+             .filter(BillItem.bill_id == bill_id)
+             .all())
     try:
+        SalesRollupService.apply(db, [
+            {
+                "day": _day(bill.date),
+                "stock_item_id": line.stock_item_id,
+                "item_variant_id": line.item_variant_id,
+                "item_quantity": line.item_quantity,
+                "price": line.price or 0.0,
+            }
+            for line in lines
+        ], sign=-1)
         db.commit()
+        BillVersion.bump()
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail="Fehler beim Löschen der Rechnung: " + str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail="Fehler beim Löschen der Rechnung: " + str(e))
@@ -0,0 +1,22 @@
+import threading
+from sqlalchemy import event
+from entity.DAO import Base
+
+# Prozesslokaler Zähler, der nach jeder committeten Änderung an Rechnungen hochgezählt wird
+# (Anlage, Batch-Upload, Löschung, Neuaufbau der Tagessummen). Die Rechnungen werden großteils
+# per Core-Statement geschrieben, deshalb ruft BillService bump() explizit nach dem Commit auf.
+
+_lock = threading.Lock()
+_version = 0
+
+def current() -> int:
+    return _version
+
+def bump():
+    global _version
+    with _lock: _version += 1
+
+@event.listens_for(Base.metadata, "after_create")
+@event.listens_for(Base.metadata, "after_drop")
+def _bump_after_ddl(target, connection, **kw):
+    bump()
@@ -0,0 +1,43 @@
+import os
+import service.CatalogVersion as CatalogVersion
+
+# Prozesslokaler Lese-Cache für Katalogdaten, gültig bis zur nächsten Katalogänderung (siehe CatalogVersion).
+# Gespeichert werden nur unveränderliche Schnappschüsse (Tupel aus Rows, Bytes), nie ORM-Objekte einer Session.
+# CATALOG_CACHE_ENABLED=false schaltet den Cache ab, dann geht jeder Aufruf direkt an die Datenbank.
+
+ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "true").lower() not in ("0", "false", "no", "off")
+
+_state = (None, {})
+_counters = {"hits": 0, "misses": 0}
+
+def get(key, loader):
+    global _state
+    if not ENABLED: return loader()
+    # Version vor dem Laden lesen: ändert sich der Katalog währenddessen, landet der Wert in einem veralteten Stand
+    version = CatalogVersion.current()
+    state_version, entries = _state
+    if state_version != version:
+        entries = {}
+        _state = (version, entries)
+    if key in entries:
+        _counters["hits"] += 1
+        return entries[key]
+    _counters["misses"] += 1
+    value = loader()
+    entries[key] = value
+    return value
+
+def clear():
+    global _state
+    _state = (None, {})
+    _counters.update(hits=0, misses=0)
+
+def stats() -> dict:
+    state_version, entries = _state
+    return {
+        "enabled": ENABLED,
+        "version": CatalogVersion.current(),
+        "entries": len(entries) if state_version == CatalogVersion.current() else 0,
+        "hits": _counters["hits"],
+        "misses": _counters["misses"],
+    }
@@ -0,0 +1,43 @@
+import asyncio
+import service.CatalogVersion as CatalogVersion
+
+# Verteilt Katalogänderungen an die offenen Event-Streams (GET /catalog/events).
+# Jeder Abonnent ist eine asyncio.Queue im Event-Loop des Servers; ein wartender Client kostet nur
+# einen schlafenden Task, keinen Thread. Veröffentlicht wird aus beliebigen Threads (Threadpool der
+# synchronen Endpunkte) über call_soon_threadsafe.
+# Kommt ein Client nicht hinterher, wird seine Queue verworfen und durch ein "resync"-Event ersetzt,
+# der Client lädt dann den Katalog neu.
+
+QUEUE_SIZE = 100
+
+_subscribers = {}
+
+def subscribe() -> asyncio.Queue:
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    _subscribers[queue] = asyncio.get_running_loop()
+    return queue
+
+def unsubscribe(queue: asyncio.Queue):
+    _subscribers.pop(queue, None)
+
+def subscriber_count() -> int:
+    return len(_subscribers)
+
+def publish(version: int, changes: list = None):
+    # Ohne Änderungsliste ist unbekannt, was sich geändert hat: "resync"
+    event = {"type": "changes" if changes is not None else "resync", "version": version, "changes": changes or []}
+    for queue, loop in list(_subscribers.items()):
+        try:
+            loop.call_soon_threadsafe(_deliver, queue, event)
+        except RuntimeError:
+            # Event-Loop bereits geschlossen
+            unsubscribe(queue)
+
+def _deliver(queue: asyncio.Queue, event: dict):
+    if not queue.full():
+        queue.put_nowait(event)
+        return
+    while not queue.empty(): queue.get_nowait()
+    queue.put_nowait({"type": "resync", "version": event["version"], "changes": []})
+
+CatalogVersion.add_listener(publish)
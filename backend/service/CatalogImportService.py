@@ -0,0 +1,140 @@
+import csv
+import io
+from fastapi import HTTPException
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from entity.DAO import Category, CategorySorting, StockItem, ItemSorting, ItemVariant
+import service.CatalogVersion as CatalogVersion
+import service.Constraints as Constraints
+import service.ItemVariantService as ItemVariantService
+import service.StockItemHeadService as StockItemHeadService
+
+# Import einer kompletten Speisekarte in einer Transaktion: erst alles im Speicher prüfen,
+# dann Kategorien, Artikel, Varianten und Sortierungen mit je einem Multi-Row-INSERT schreiben.
+#
+# CSV-Spalten: category, category_icon, item, deposit_amount, variant, price, bill_steps (eine Zeile je Variante)
+# Eingabe (JSON bzw. aus der CSV gebaut):
+#   [{"name": "Getränke", "icon": "MdLocalBar", "items": [
+#       {"name": "Bier", "deposit_amount": 2.0, "variants": [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}]}]}]
+# Bestehende Kategorien werden über den Namen gefunden, fehlende angelegt. Artikel werden immer neu angelegt;
+# ein gleichnamiger aktiver Artikel in derselben Kategorie bricht den Import ab.
+
+DEFAULT_ICON = "MdCategory"
+
+def parse_csv(data: bytes) -> list[dict]:
+    # Eine Zeile je Variante; Trennzeichen "," oder ";" (Excel), bei ";" sind Dezimalkommas erlaubt
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV muss UTF-8-kodiert sein")
+    try:
+        dialect = csv.Sniffer().sniff(text.split("\n", 1)[0], delimiters=",;")
+    except csv.Error:
+        raise HTTPException(status_code=400, detail="CSV-Kopfzeile nicht erkannt")
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    missing = {"category", "item", "price"} - set(reader.fieldnames or [])
+    if missing: raise HTTPException(status_code=400, detail=f"CSV-Spalten fehlen: {sorted(missing)}")
+    categories = {}
+    for line, row in enumerate(reader, start=2):
+        try:
+            category = categories.setdefault(row["category"], {"name": row["category"], "icon": row.get("category_icon") or None, "items": {}})
+            item = category["items"].setdefault(row["item"], {
+                "name": row["item"], "deposit_amount": _number(row.get("deposit_amount"), dialect, 0.0), "variants": []
+            })
+            item["variants"].append({
+                "name": row.get("variant") or None,
+                "price": _number(row["price"], dialect),
+                "bill_steps": _number(row.get("bill_steps"), dialect, 1.0),
+            })
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"CSV-Zeile {line}: {e}")
+    return [{**c, "items": list(c["items"].values())} for c in categories.values()]
+
+def _number(value, dialect, default: float = None) -> float:
+    if value is None or value.strip() == "":
+        if default is None: raise ValueError("Zahl fehlt")
+        return default
+    if dialect.delimiter == ";": value = value.replace(",", ".")
+    return float(value)
+
+def validate(db: Session, categories: list[dict]) -> dict:
+    # Prüft alles vor dem ersten Schreibzugriff; liefert die IDs der bereits vorhandenen Kategorien
+    if not categories: raise HTTPException(status_code=400, detail="Import darf nicht leer sein")
+    names = [c["name"] for c in categories]
+    for name in names:
+        if name is None or name.strip() == "" or len(name) > 50: raise HTTPException(status_code=400, detail="Kategoriename darf nicht leer sein")
+    if len(set(names)) != len(names): raise HTTPException(status_code=400, detail="Kategorie mehrfach im Import enthalten")
+    existing = dict(db.query(Category.name, Category.id).filter(Category.name.in_(names)).all())
+    active_items = set(
+        db.query(StockItem.category_id, StockItem.name)
+        .filter(StockItem.is_active, StockItem.category_id.in_(existing.values()))
+        .all()
+    )
+    for category in categories:
+        item_names = set()
+        for item in category["items"]:
+            name = item["name"]
+            if name is None or name.strip() == "" or len(name) > 50: raise HTTPException(status_code=400, detail="Name darf nicht leer sein")
+            if name in item_names or (existing.get(category["name"]), name) in active_items:
+                raise HTTPException(status_code=400, detail=f"Artikel {name} existiert bereits in Kategorie {category['name']} und ist aktiv")
+            item_names.add(name)
+            if not item["variants"]: raise HTTPException(status_code=400, detail=f"Artikel {name} braucht mindestens eine Variante")
+            ItemVariantService.validate_all(item["variants"], f"{name}: ")
+    return existing
+
+def import_catalog(db: Session, categories: list[dict]) -> dict:
+    existing = validate(db, categories)
+    try:
+        CatalogVersion.lock_changes(db)
+        category_ids = dict(existing)
+        new_categories = [c for c in categories if c["name"] not in existing]
+        if new_categories:
+            rows = db.execute(
+                insert(Category).returning(Category.id, Category.name, sort_by_parameter_order=True),
+                [{"name": c["name"], "icon": c.get("icon") or DEFAULT_ICON} for c in new_categories],
+            )
+            created = {row.name: row.id for row in rows}
+            category_ids.update(created)
+            # Wie CategoryService.create: neue Kategorien hinten anhängen
+            category_sort = db.query(func.count(CategorySorting.id)).scalar()
+            db.execute(insert(CategorySorting), [
+                {"category_id": created[c["name"]], "sort_order": category_sort + i + 1} for i, c in enumerate(new_categories)
+            ])
+
+        items = [(category_ids[c["name"]], item) for c in categories for item in c["items"]]
+        item_ids = []
+        if items:
+            valid_from = CatalogVersion.version_time(db)
+            item_ids = list(db.execute(
+                insert(StockItem).returning(StockItem.id, sort_by_parameter_order=True),
+                [{"name": item["name"], "category_id": category_id, "deposit_amount": item.get("deposit_amount") or 0.0,
+                  "is_active": True, "version": 1, "valid_from": valid_from} for category_id, item in items],
+            ).scalars())
+            db.execute(insert(ItemVariant), [
+                {"stock_item_id": item_id, "name": v["name"], "price": v["price"], "bill_steps": v["bill_steps"], "is_active": True, "version": 1,
+                 "valid_from": valid_from}
+                for item_id, (_, item) in zip(item_ids, items) for v in item["variants"]
+            ])
+            StockItemHeadService.advance(db, [{"base_item_id": item_id, "current_item_id": item_id, "version": 1} for item_id in item_ids])
+            # Wie StockItemService.create: sort_order = Anzahl vorhandener Einträge
+            item_sort = db.query(func.count(ItemSorting.id)).scalar()
+            db.execute(insert(ItemSorting), [{"item_id": item_id, "sort_order": item_sort + i} for i, item_id in enumerate(item_ids)])
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=Constraints.message(e, f"Integritätsfehler beim Import: {str(e.orig)}"))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Fehler beim Import: {str(e)}")
+    # Core-Statements laufen an den Session-Events vorbei
+    CatalogVersion.bump()
+    return {
+        "categories_created": len(new_categories),
+        "stock_items_created": len(item_ids),
+        "item_variants_created": sum(len(item["variants"]) for _, item in items),
+        "stock_item_ids": item_ids,
+    }
@@ -0,0 +1,68 @@
+import json
+from datetime import datetime
+from sqlalchemy.orm import Session
+from entity.DAO import StockItem, ItemVariant
+import service.CategoryService as CategoryService
+import service.CategorySortingService as CategorySortingService
+import service.StockItemService as StockItemService
+import service.StockItemSortingService as StockItemSortingService
+import service.ItemVariantService as ItemVariantService
+import service.CatalogCache as CatalogCache
+
+# Der serialisierte Katalog liegt bis zur nächsten Katalogänderung im CatalogCache,
+# GET /catalog beantwortet Wiederholungen ohne Datenbankzugriff.
+#
+# Mit as_of (z.B. Bill.date) liefert load() Artikel und Varianten in der Version, die zum Zeitpunkt gültig war
+# (valid_from/valid_to, siehe CatalogVersion). Kategorien und Sortierungen sind nicht versioniert und kommen
+# im heutigen Stand. change_cursor ist dann 0: ein historischer Stand taugt nicht als Startpunkt für den Delta-Sync.
+
+def load(db: Session, as_of: datetime = None) -> dict:
+    items = StockItemService.get_all(db, as_of)
+    variants = ItemVariantService.get_active_by_stock_items(db, [i.id for i in items], as_of)
+    return {
+        "change_cursor": _change_cursor(items, [v for vs in variants.values() for v in vs]) if as_of is None else 0,
+        "categories": [{"id": c.id, "name": c.name, "icon": c.icon} for c in CategoryService.get_all(db)],
+        "category_sorting": [{"category_id": s.category_id, "sort_order": s.sort_order} for s in CategorySortingService.get_all_sortings(db)],
+        "stock_items": [{
+            "id": i.id,
+            "name": i.name,
+            "category_id": i.category_id,
+            "deposit_amount": i.deposit_amount,
+            "is_active": i.is_active,
+            "item_variants": [
+                {"id": v.id, "name": ItemVariantService.display_name(v), "price": v.price, "bill_steps": v.bill_steps}
+                for v in variants[i.id]
+            ],
+        } for i in items],
+        "item_sorting": [{"item_id": s.item_id, "sort_order": s.sort_order} for s in StockItemSortingService.get_all_sortings(db)],
+    }
+
+def _change_cursor(items, variants) -> int:
+    # Konservativer Cursor für GET /catalog/changes: höchster change_seq, den jede der beiden Listen sicher
+    # enthält. change_seq wird in Commit-Reihenfolge vergeben (CatalogVersion.lock_changes), also ist jede
+    # Änderung bis zum Minimum in beiden Listen enthalten; alles danach liefert /catalog/changes (idempotent).
+    return min(max((row.change_seq or 0 for row in rows), default=0) for rows in (items, variants))
+
+def get_changes(db: Session, since: int) -> dict:
+    # StockItems und ItemVariants, die nach dem Cursor angelegt oder geändert (z.B. deaktiviert) wurden
+    items = (db.query(*StockItemService.STOCK_ITEM_COLUMNS)
+             .filter(StockItem.change_seq > since)
+             .order_by(StockItem.change_seq).all())
+    variants = (db.query(*ItemVariantService.VARIANT_COLUMNS)
+                .filter(ItemVariant.change_seq > since)
+                .order_by(ItemVariant.change_seq).all())
+    return {
+        "cursor": max((row.change_seq for row in (*items, *variants)), default=since),
+        "stock_items": [{
+            "id": i.id, "name": i.name, "category_id": i.category_id, "deposit_amount": i.deposit_amount,
+            "is_active": i.is_active, "change_seq": i.change_seq,
+        } for i in items],
+        "item_variants": [{
+            "id": v.id, "stock_item_id": v.stock_item_id, "name": ItemVariantService.display_name(v), "price": v.price,
+            "bill_steps": v.bill_steps, "is_active": v.is_active, "change_seq": v.change_seq,
+        } for v in variants],
+    }
+
+def get_body(db: Session, as_of: datetime = None) -> bytes:
+    serialize = lambda: json.dumps(load(db, as_of), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return serialize() if as_of is not None else CatalogCache.get("catalog", serialize)
@@ -0,0 +1,103 @@
+import threading
+from datetime import datetime
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from entity.DAO import CATALOG_CHANGE_SEQ, Base, Category, CategorySorting, StockItem, ItemSorting, ItemVariant
+
+# Prozesslokaler Zähler, der bei jeder committeten Änderung am Katalog hochgezählt wird.
+# Caches (siehe CatalogCache) merken sich die Version, mit der sie gebaut wurden.
+# ORM-Änderungen werden über Session-Events erkannt, Core-Statements müssen bump() selbst aufrufen.
+# Auch create_all/drop_all zählen als Änderung (z.B. in den Tests).
+#
+# Listener (siehe CatalogEvents) bekommen nach jedem bump() die neue Version und die Änderungen:
+# [{"entity": <Tabellenname>, "id": ..., "op": "upsert" | "delete", "data": {Spalten} | None}, ...]
+# Deaktivierte Artikel und Varianten (is_active=False) gelten als "delete". bump() ohne Änderungsliste
+# (Core-Statements, DDL) meldet changes=None, die Clients laden dann neu.
+#
+# Neue StockItems/ItemVariants bekommen vor dem Flush valid_from, deaktivierte valid_to, beide aus version_time():
+# ein Zeitpunkt je Transaktion, damit alte und neue Version lückenlos aneinander anschließen. Lokale Zeit wie
+# Bill.date, so lässt sich der Katalog zum Zeitpunkt einer Rechnung rekonstruieren (as_of).
+#
+# Geänderte StockItems/ItemVariants bekommen vor dem Flush einen neuen change_seq. Damit die Reihenfolge
+# der change_seq der Commit-Reihenfolge entspricht (sonst könnte ein Client einen später committeten,
+# kleineren Wert überspringen), serialisiert lock_changes() alle Transaktionen, die change_seq vergeben.
+
+CATALOG_ENTITIES = (Category, CategorySorting, StockItem, ItemSorting, ItemVariant)
+CHANGE_SEQ_ENTITIES = (StockItem, ItemVariant)
+
+_lock = threading.Lock()
+_version = 0
+_listeners = []
+
+def current() -> int:
+    return _version
+
+def bump(changes: list = None):
+    global _version
+    with _lock:
+        _version += 1
+        version = _version
+    for listener in _listeners: listener(version, changes)
+
+def add_listener(listener):
+    _listeners.append(listener)
+
+def lock_changes(db: Session):
+    # Transaktions-Lock, wird beim Commit bzw. Rollback freigegeben; auch Core-Statements, die
+    # StockItems/ItemVariants schreiben, müssen ihn vorher nehmen
+    db.connection().execute(text("SELECT pg_advisory_xact_lock(hashtext('catalog_change_seq'))"))
+
+def record_deactivated(session: Session, entity, ids):
+    # Für mengenbasierte UPDATEs (is_active=False), die nicht über den Flush laufen; gemeldet wird beim Commit
+    changes = session.info.setdefault("catalog_changes", {})
+    for id in ids: changes[(entity.__tablename__, id)] = {"entity": entity.__tablename__, "id": id, "op": "delete", "data": None}
+
+def version_time(session: Session) -> datetime:
+    # Zeitstempel für valid_from/valid_to, fest für die laufende Transaktion; auch für mengenbasierte UPDATEs
+    return session.info.setdefault("version_time", datetime.now())
+
+def change(obj, deleted: bool = False) -> dict:
+    entity = obj.__tablename__
+    if deleted or getattr(obj, "is_active", True) is False:
+        return {"entity": entity, "id": obj.id, "op": "delete", "data": None}
+    # Nur geladene Spalten: per SQL-Ausdruck gesetzte Werte (change_seq) sind nach dem Flush expired
+    state = inspect(obj)
+    data = {attr.key: state.dict[attr.key] for attr in state.mapper.column_attrs if attr.key in state.dict}
+    return {"entity": entity, "id": obj.id, "op": "upsert", "data": data}
+
+@event.listens_for(Base.metadata, "after_create")
+@event.listens_for(Base.metadata, "after_drop")
+def _bump_after_ddl(target, connection, **kw):
+    bump()
+
+@event.listens_for(Session, "before_flush")
+def _stamp_versions(session, flush_context, instances):
+    new = [obj for obj in session.new if isinstance(obj, CHANGE_SEQ_ENTITIES)]
+    dirty = [obj for obj in session.dirty if isinstance(obj, CHANGE_SEQ_ENTITIES) and session.is_modified(obj)]
+    if not new and not dirty: return
+    lock_changes(session)
+    for obj in new:
+        if obj.valid_from is None: obj.valid_from = version_time(session)
+    for obj in dirty:
+        obj.change_seq = CATALOG_CHANGE_SEQ.next_value()
+        if False in inspect(obj).attrs.is_active.history.added: obj.valid_to = version_time(session)
+
+@event.listens_for(Session, "after_flush")
+def _collect_catalog_changes(session, flush_context):
+    # Nach dem Flush haben neue Objekte ihre ID, die Attribute sind noch nicht expired
+    changes = session.info.setdefault("catalog_changes", {})
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, CATALOG_ENTITIES) and session.is_modified(obj): changes[(obj.__tablename__, obj.id)] = change(obj)
+    for obj in session.deleted:
+        if isinstance(obj, CATALOG_ENTITIES): changes[(obj.__tablename__, obj.id)] = change(obj, deleted=True)
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session):
+    session.info.pop("version_time", None)
+    changes = session.info.pop("catalog_changes", None)
+    if changes: bump(list(changes.values()))
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("version_time", None)
+    session.info.pop("catalog_changes", None)
@@ -2,19 +2,20 @@ from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from entity.DAO import Category, CategorySorting
+import service.CatalogCache as CatalogCache
+import service.Constraints as Constraints
 
 def get_all(db: Session):
-    return db.query(Category).all()
+    return list(CatalogCache.get("categories", lambda: tuple(db.query(Category.id, Category.name, Category.icon))))
 
 def get_by_id(db: Session, category_id: int):
-    category = db.query(Category).filter(Category.id == category_id).first()
+    category = CatalogCache.get(("category", category_id), lambda: db.query(Category.id, Category.name, Category.icon).filter(Category.id == category_id).first())
     if not category: raise HTTPException(status_code=404, detail="Kategorie nicht gefunden")
     return category
 
 def create(db: Session, name: str, icon: str):
     if name is None or not name or name.strip() == "": raise HTTPException(status_code=400, detail="Name darf nicht leer sein")
     if icon is None or not icon or icon.strip() == "": raise HTTPException(status_code=400, detail="Icon darf nicht leer sein")
-    if db.query(Category).filter(Category.name == name).first(): raise HTTPException(status_code=400, detail="Kategorie mit diesem Namen existiert bereits")
     category = Category(name=name, icon=icon)
     db.add(category)
     try:
@@ -28,7 +29,7 @@ def create(db: Session, name: str, icon: str):
         return category
     except IntegrityError as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail="Integritätsfehler: " + str(e.orig))
+        raise HTTPException(status_code=400, detail=Constraints.message(e, "Integritätsfehler: " + str(e.orig)))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail="Fehler bei der Erstellung der Kategorie: " + str(e))
@@ -38,7 +39,6 @@ def update(db: Session, category_id: int, name: str = None, icon: str = None):
     if not category: raise HTTPException(status_code=404, detail="Kategorie nicht gefunden")
     if name is None or not name or name.strip() == "": raise HTTPException(status_code=400, detail="Name darf nicht leer sein")
     if icon is None or not icon or icon.strip() == "": raise HTTPException(status_code=400, detail="Icon darf nicht leer sein")
-    if name != category.name and db.query(Category).filter(Category.name == name).first(): raise HTTPException(status_code=400, detail="Kategorie mit diesem Namen existiert bereits")
     category.name = name
     category.icon = icon
     try:
@@ -46,7 +46,7 @@ def update(db: Session, category_id: int, name: str = None, icon: str = None):
         db.refresh(category)
     except IntegrityError as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail="Integritätsfehler: " + str(e.orig))
+        raise HTTPException(status_code=400, detail=Constraints.message(e, "Integritätsfehler: " + str(e.orig)))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail="Fehler bei der Aktualisierung der Kategorie: " + str(e))
@@ -0,0 +1,18 @@
+from sqlalchemy.exc import IntegrityError
+
+# Eindeutigkeitsregeln liegen als (Partial-)Unique-Indizes in der Datenbank (siehe entity/DAO.py).
+# Statt vor jedem Schreiben nach Duplikaten zu suchen, schreiben die Services direkt und übersetzen
+# eine Verletzung beim Flush/Commit in die bisherige Fehlermeldung.
+
+UNIQUE_MESSAGES = {
+    "category_name_key": "Kategorie mit diesem Namen existiert bereits",
+    "ux_stock_item_live_category": "Artikel mit diesem Namen existiert bereits in dieser Kategorie und ist aktiv",
+    "ux_item_variant_live_price": "Variante mit gleichem Namen und gleichem Preis existiert bereits",
+    "ux_item_variant_live_steps": "Variante mit gleichem Namen und gleichem Rechenschritt aber anderem Preis existiert bereits",
+}
+
+def constraint_name(e: IntegrityError) -> str:
+    return getattr(getattr(e.orig, "diag", None), "constraint_name", None)
+
+def message(e: IntegrityError, default: str) -> str:
+    return UNIQUE_MESSAGES.get(constraint_name(e), default)
@@ -2,10 +2,12 @@ from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from entity.DAO import DepositReturn, StockItem
-from datetime import date
+from datetime import datetime
+import service.TimeRange as TimeRange
+from service.TimeRange import DateOrTime
 
-def get_all(db: Session):
-    return db.query(DepositReturn).all()
+def get_all(db: Session, date_from: DateOrTime = None, date_to: DateOrTime = None):
+    return TimeRange.apply(db.query(DepositReturn), DepositReturn.created_at, date_from, date_to).all()
 
 def get_by_id(db: Session, deposit_return_id: int):
     deposit_return = db.query(DepositReturn).filter(DepositReturn.id == deposit_return_id).first()
@@ -32,7 +34,7 @@ def create(db: Session, stock_item_id: int, quantity: int):
         quantity=quantity,
         deposit_amount_per_item=stock_item.deposit_amount,
         total_amount=total_amount,
-        created_at=date.today()
+        created_at=datetime.now()
     )
     
     db.add(deposit_return)
@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+import zipfile
+from datetime import date, datetime
+from typing import Iterable, Iterator
+from xml.sax.saxutils import escape
+
+# Schreiber für den Export großer Datenmengen. Alle Funktionen nehmen einen Iterator von Dicts
+# und liefern die Datei stückweise als bytes, sodass der Speicherbedarf unabhängig von der Zeilenzahl bleibt.
+
+ROWS_PER_CHUNK = 500
+
+def _plain(value):
+    if isinstance(value, (date, datetime)): return value.isoformat()
+    return value
+
+def to_csv(rows: Iterable[dict], columns: list[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, damit Excel Umlaute korrekt als UTF-8 erkennt
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_plain(row[c]) for c in columns])
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+def to_ndjson(rows: Iterable[dict], columns: list[str]) -> Iterator[bytes]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({c: _plain(row[c]) for c in columns}, ensure_ascii=False))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines: yield ("\n".join(lines) + "\n").encode("utf-8")
+
+class _ChunkSink(io.RawIOBase):
+    # Nicht-seekbares Ziel für zipfile: alles Geschriebene wird gesammelt und per drain() abgeholt
+    def __init__(self):
+        self._chunks = []
+    def writable(self):
+        return True
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+def _xlsx_cell(value) -> str:
+    if value is None: return "<c/>"
+    if isinstance(value, bool): return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)): return f"<c><v>{value}</v></c>"
+    return f'<c t="inlineStr"><is><t>{escape(str(_plain(value)))}</t></is></c>'
+
+def _xlsx_row(values) -> bytes:
+    return ("<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>").encode("utf-8")
+
+def to_xlsx(rows: Iterable[dict], columns: list[str], sheet_name: str = "Export") -> Iterator[bytes]:
+    # Minimales XLSX mit Inline-Strings (ohne Shared-Strings-Tabelle), damit das Tabellenblatt
+    # zeilenweise in den ZIP-Stream geschrieben werden kann
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _XLSX_WORKBOOK.format(sheet_name=escape(sheet_name)))
+        archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(_xlsx_row(columns))
+            for count, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row([row[c] for c in columns]))
+                if count % ROWS_PER_CHUNK == 0: yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
@@ -1,24 +1,72 @@
 from fastapi import HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from entity.DAO import StockItem, ItemVariant
-from typing import List
+from datetime import datetime
+from typing import Dict, List
+import service.CatalogCache as CatalogCache
+import service.Constraints as Constraints
+import service.TimeRange as TimeRange
+
+# Lesepfade liefern Rows (Schnappschüsse aus dem CatalogCache), keine ORM-Objekte: nichts landet in der
+# Identity Map, nichts kann beim nächsten Commit versehentlich geschrieben werden. Der Ersatzname für
+# Varianten ohne Namen (display_name) wird erst beim Serialisieren in den Controllern eingesetzt.
+VARIANT_COLUMNS = (ItemVariant.id, ItemVariant.stock_item_id, ItemVariant.name, ItemVariant.price,
+                   ItemVariant.bill_steps, ItemVariant.is_active, ItemVariant.version, ItemVariant.change_seq)
 
 def get_all_in_stock_item(db: Session, stock_item_id: int) -> List[ItemVariant]:
-    query = db.query(ItemVariant)
     if stock_item_id is None: raise HTTPException(status_code=400, detail="StockItem ID ist erforderlich")
-    query = query.filter(ItemVariant.stock_item_id == stock_item_id)
-    variants = query.all()
-    for v in variants:
-        if v.name is None or v.name.strip() == "": v.name = str(v.bill_steps)
-    return variants
+    return list(CatalogCache.get(("variants", stock_item_id), lambda: tuple(
+        db.query(*VARIANT_COLUMNS).filter(ItemVariant.stock_item_id == stock_item_id).order_by(ItemVariant.id))))
+
+def get_active_by_stock_items(db: Session, stock_item_ids: List[int], as_of: datetime = None) -> Dict[int, List[ItemVariant]]:
+    # Aktive Varianten mehrerer Artikel in einer Query, gruppiert nach stock_item_id;
+    # mit as_of die zum Zeitpunkt gültigen (ungecacht, siehe StockItemService.get_all_as_of)
+    def load():
+        variants = {stock_item_id: [] for stock_item_id in stock_item_ids}
+        if not variants: return {}
+        query = (db.query(*VARIANT_COLUMNS)
+                 .filter(ItemVariant.stock_item_id.in_(variants.keys()),
+                         ItemVariant.is_active if as_of is None else TimeRange.valid_at(ItemVariant, as_of))
+                 .order_by(ItemVariant.id))
+        for v in query: variants[v.stock_item_id].append(v)
+        return {stock_item_id: tuple(v) for stock_item_id, v in variants.items()}
+    if as_of is not None: return {stock_item_id: list(v) for stock_item_id, v in load().items()}
+    cached = CatalogCache.get(("active_variants", tuple(stock_item_ids)), load)
+    return {stock_item_id: list(cached[stock_item_id]) for stock_item_id in stock_item_ids}
+
+def display_name(variant: ItemVariant) -> str:
+    if variant.name is None or variant.name.strip() == "": return str(variant.bill_steps)
+    return variant.name
+
+def validate_all(variants: List[dict], prefix: str = ""):
+    # Dieselben Regeln wie create/update, für alle Varianten eines Artikels auf einmal (in Listenreihenfolge)
+    for i, v in enumerate(variants):
+        if v["name"] is not None and len(v["name"]) > 50: raise HTTPException(status_code=400, detail=f"{prefix}Variantenname zu lang")
+        if v["price"] is None or v["price"] < 0: raise HTTPException(status_code=400, detail=f"{prefix}Preis muss >= 0 sein")
+        if v["bill_steps"] is None or v["bill_steps"] <= 0: raise HTTPException(status_code=400, detail=f"{prefix}Rechenschritt muss > 0 sein")
+        for other in variants[:i]:
+            if (other["name"] or "") != (v["name"] or ""): continue
+            if other["price"] == v["price"]:
+                raise HTTPException(status_code=400, detail=f"{prefix}Variante mit gleichem Namen und gleichem Preis existiert bereits")
+            if other["bill_steps"] == v["bill_steps"]:
+                raise HTTPException(status_code=400, detail=f"{prefix}Variante mit gleichem Namen und gleichem Rechenschritt aber anderem Preis existiert bereits")
 
 def get_by_id(db: Session, variant_id: int) -> ItemVariant:
-    variant = db.query(ItemVariant).filter(ItemVariant.id == variant_id).first()
+    variant = CatalogCache.get(("variant", variant_id), lambda: db.query(*VARIANT_COLUMNS).filter(ItemVariant.id == variant_id).first())
     if not variant: raise HTTPException(status_code=404, detail="Variante nicht gefunden")
-    if variant.name is None or variant.name.strip() == "": variant.name = str(variant.bill_steps)
     return variant
 
+def _duplicate_message(db: Session, e: IntegrityError, stock_item_id: int, name: str, price: float) -> str:
+    # Ein exaktes Duplikat verletzt beide Varianten-Indizes, gemeldet wird der zuerst geprüfte.
+    # Bei gleichem Preis gilt wie bisher die Preis-Meldung (eine Query nur im Fehlerfall).
+    if Constraints.constraint_name(e) == "ux_item_variant_live_steps" and db.query(ItemVariant.id).filter(
+            ItemVariant.stock_item_id == stock_item_id, func.coalesce(ItemVariant.name, "") == (name or ""),
+            ItemVariant.price == price, ItemVariant.is_active).first():
+        return Constraints.UNIQUE_MESSAGES["ux_item_variant_live_price"]
+    return Constraints.message(e, f"Integritätsfehler: {str(e.orig)}")
+
 def create(db: Session, stock_item_id: int, name: str = None, price: float = None, bill_steps: float = 1.0) -> ItemVariant:
     if not db.query(StockItem).filter(StockItem.id == stock_item_id).first():
         raise HTTPException(status_code=404, detail="StockItem nicht gefunden")
@@ -27,19 +75,8 @@ def create(db: Session, stock_item_id: int, name: str = None, price: float = Non
     if bill_steps is None or bill_steps <= 0:
         raise HTTPException(status_code=400, detail="Rechenschritt muss > 0 sein")
 
-    # Prüfe auf doppelte Varianten - nur bei gleichem Namen UND Preis
-    existing = db.query(ItemVariant).filter(
-        ItemVariant.stock_item_id == stock_item_id,
-        ItemVariant.is_active == True
-    ).all()
-    for v in existing:
-        # Nur verbieten wenn Name UND Preis gleich sind (verschiedene Namen mit gleichem Preis sind erlaubt)
-        if (v.name or "") == (name or "") and v.price == price:
-            raise HTTPException(status_code=400, detail="Variante mit gleichem Namen und gleichem Preis existiert bereits")
-        # Oder wenn Name UND bill_steps gleich sind aber unterschiedlicher Preis (verwirrend für Nutzer)
-        if (v.name or "") == (name or "") and v.bill_steps == bill_steps and v.price != price:
-            raise HTTPException(status_code=400, detail="Variante mit gleichem Namen und gleichem Rechenschritt aber anderem Preis existiert bereits")
-
+    # Doppelte Varianten (gleicher Name mit gleichem Preis bzw. Rechenschritt) verhindern die Unique-Indizes,
+    # siehe Constraints
     variant = ItemVariant(
         stock_item_id=stock_item_id,
         name=name,
@@ -52,11 +89,10 @@ def create(db: Session, stock_item_id: int, name: str = None, price: float = Non
     try:
         db.commit()
         db.refresh(variant)
-        if variant.name is None or variant.name.strip() == "": variant.name = str(variant.bill_steps)
         return variant
     except IntegrityError as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail=f"Integritätsfehler: {str(e.orig)}")
+        raise HTTPException(status_code=400, detail=_duplicate_message(db, e, stock_item_id, name, price))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Fehler beim Erstellen der Variante: {str(e)}")
@@ -71,22 +107,13 @@ def update(db: Session, variant_id: int, name: str = None, price: float = None,
     new_bill_steps = bill_steps if bill_steps is not None else variant.bill_steps
     new_stock_item_id = stock_item_id if stock_item_id is not None else variant.stock_item_id
 
-    existing = db.query(ItemVariant).filter(
-        ItemVariant.stock_item_id == new_stock_item_id,
-        ItemVariant.is_active == True,
-        ItemVariant.id != variant_id
-    ).all()
-    for v in existing:
-        # Nur verbieten wenn Name UND Preis gleich sind
-        if (v.name or "") == (new_name or "") and v.price == new_price: 
-            raise HTTPException(status_code=400, detail="Variante mit gleichem Namen und gleichem Preis existiert bereits")
-        # Oder wenn Name UND bill_steps gleich sind aber unterschiedlicher Preis
-        if (v.name or "") == (new_name or "") and v.bill_steps == new_bill_steps and v.price != new_price: 
-            raise HTTPException(status_code=400, detail="Variante mit gleichem Namen und gleichem Mengenangaben aber anderem Preis existiert bereits")
-
     new_data = variant.__dict__.copy()
     new_data.pop("id", None)
+    new_data.pop("change_seq", None)
     new_data.pop("_sa_instance_state", None)
+    # Gültigkeit setzt CatalogVersion beim Flush (version_time), nicht von der alten Version übernehmen
+    new_data.pop("valid_from", None)
+    new_data.pop("valid_to", None)
     new_data["name"] = new_name
     new_data["price"] = new_price
     new_data["bill_steps"] = new_bill_steps
@@ -97,18 +124,17 @@ def update(db: Session, variant_id: int, name: str = None, price: float = None,
     if new_data["price"] is None or new_data["price"] < 0: raise HTTPException(status_code=400, detail="Preis muss >= 0 sein")
     if new_data["bill_steps"] is None or new_data["bill_steps"] <= 0: raise HTTPException(status_code=400, detail="Mengenangaben muss > 0 sein")
 
+    # Die alte Version wird im selben Flush vor dem INSERT deaktiviert und zählt daher nicht als Duplikat
     new_variant = ItemVariant(**new_data)
     variant.is_active = False
     db.add(new_variant)
     try:
         db.commit()
         db.refresh(new_variant)
-        if new_variant.name is None or new_variant.name.strip() == "":
-            new_variant.name = str(new_variant.bill_steps)
         return new_variant
     except IntegrityError as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail=f"Integritätsfehler: {str(e.orig)}")
+        raise HTTPException(status_code=400, detail=_duplicate_message(db, e, new_data["stock_item_id"], new_name, new_price))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Fehler beim Aktualisieren der Variante: {str(e)}")
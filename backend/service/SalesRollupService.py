@@ -0,0 +1,51 @@
+from sqlalchemy import func, insert, delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from entity.DAO import Bill, BillItem, ItemVariant, SalesDailyRollup
+import service.BillVersion as BillVersion
+
+def apply(db: Session, lines: list[dict], sign: int = 1):
+    # Addiert (sign=1) bzw. subtrahiert (sign=-1) Rechnungspositionen auf die Tagessummen.
+    # Jede Position braucht day, stock_item_id, item_variant_id, item_quantity und price.
+    # Läuft in der Transaktion des Aufrufers, committet also nicht selbst.
+    totals = {}
+    for line in lines:
+        key = (line["day"], line["stock_item_id"], line["item_variant_id"])
+        quantity, revenue = totals.get(key, (0.0, 0.0))
+        totals[key] = (quantity + sign * line["item_quantity"], revenue + sign * line["item_quantity"] * line["price"])
+    if not totals: return
+    stmt = pg_insert(SalesDailyRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SalesDailyRollup.day, SalesDailyRollup.stock_item_id, SalesDailyRollup.item_variant_id],
+        set_={
+            "quantity": SalesDailyRollup.quantity + stmt.excluded.quantity,
+            "revenue": SalesDailyRollup.revenue + stmt.excluded.revenue,
+        }
+    )
+    # Sortiert: jede Transaktion sperrt die Summenzeilen in derselben Reihenfolge, sonst können sich zwei
+    # Rechnungen mit denselben Varianten in anderer Reihenfolge gegenseitig blockieren (Deadlock)
+    db.execute(stmt, [
+        {"day": day, "stock_item_id": stock_item_id, "item_variant_id": item_variant_id, "quantity": quantity, "revenue": revenue}
+        for (day, stock_item_id, item_variant_id), (quantity, revenue) in sorted(totals.items())
+    ])
+
+def rebuild(db: Session):
+    # Baut die Tagessummen komplett aus bill_item neu auf (Backfill bzw. Reparatur)
+    db.execute(delete(SalesDailyRollup))
+    day = func.date(Bill.date)
+    source = (select(
+                day,
+                ItemVariant.stock_item_id,
+                BillItem.item_variant_id,
+                func.sum(BillItem.item_quantity),
+                func.sum(BillItem.item_quantity * func.coalesce(BillItem.item_price, ItemVariant.price)))
+              .select_from(BillItem)
+              .join(Bill, Bill.id == BillItem.bill_id)
+              .join(ItemVariant, ItemVariant.id == BillItem.item_variant_id)
+              .where(Bill.is_deleted == False)
+              .group_by(day, ItemVariant.stock_item_id, BillItem.item_variant_id))
+    db.execute(insert(SalesDailyRollup).from_select(
+        ["day", "stock_item_id", "item_variant_id", "quantity", "revenue"], source
+    ))
+    db.commit()
+    BillVersion.bump()
@@ -0,0 +1,53 @@
+from sqlalchemy import func, insert, delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from entity.DAO import StockItem, StockItemHead
+
+# Kopfzeiger der Artikelversionen: je Original (base_item_id) die aktuelle Zeile und Version.
+# Ersetzt das Durchsuchen aller Versionen nach der höchsten Versionsnummer durch einen Primärschlüssel-Zugriff.
+# Gelöschte (deaktivierte) Artikel behalten ihren Kopf, er zeigt dann auf die letzte, inaktive Version.
+
+# Gruppiert alle Versionen eines Artikels (Ausdrucksindex ix_stock_item_lineage)
+LINEAGE = func.coalesce(StockItem.base_item_id, StockItem.id)
+
+def base_id(item: StockItem) -> int:
+    return item.base_item_id or item.id
+
+def lock_versions(db: Session, base_item_ids) -> dict:
+    # Aktuelle Version je Original; sperrt die Köpfe bis zum Commit, damit parallele Bearbeitungen
+    # desselben Artikels nicht dieselbe Versionsnummer vergeben.
+    # Fehlt ein Kopf (Altdaten vor rebuild()), wird die Version aus den Artikelzeilen bestimmt.
+    base_item_ids = set(base_item_ids)
+    versions = dict(db.query(StockItemHead.base_item_id, StockItemHead.version)
+                    .filter(StockItemHead.base_item_id.in_(base_item_ids))
+                    .with_for_update())
+    missing = base_item_ids - versions.keys()
+    if missing:
+        versions.update(db.query(LINEAGE, func.max(StockItem.version)).filter(LINEAGE.in_(missing)).group_by(LINEAGE))
+    return versions
+
+def advance(db: Session, heads: list[dict]):
+    # Setzt die Köpfe auf die neuen Versionen; jeder Eintrag braucht base_item_id, current_item_id und version.
+    # Läuft in der Transaktion des Aufrufers, committet also nicht selbst.
+    if not heads: return
+    stmt = pg_insert(StockItemHead)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StockItemHead.base_item_id],
+        set_={"current_item_id": stmt.excluded.current_item_id, "version": stmt.excluded.version}
+    )
+    db.execute(stmt, heads)
+
+def lineage_ids(item_id: int):
+    # Subquery mit den IDs aller Versionen des Artikels, zu dem item_id gehört (beliebige Version),
+    # z.B. für Auswertungen über alle Versionen: BillItem ... ItemVariant.stock_item_id.in_(lineage_ids(id))
+    base = select(LINEAGE).where(StockItem.id == item_id).scalar_subquery()
+    return select(StockItem.id).where(LINEAGE == base)
+
+def rebuild(db: Session):
+    # Baut die Köpfe aus stock_item neu auf (Backfill bzw. Reparatur)
+    db.execute(delete(StockItemHead))
+    source = (select(LINEAGE, StockItem.id, func.coalesce(StockItem.version, 1))
+              .distinct(LINEAGE)
+              .order_by(LINEAGE, StockItem.version.desc().nullslast(), StockItem.id.desc()))
+    db.execute(insert(StockItemHead).from_select(["base_item_id", "current_item_id", "version"], source))
+    db.commit()
@@ -1,136 +1,144 @@
 from fastapi import HTTPException
+from sqlalchemy import func, true
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from entity.DAO import StockItem, Category, ItemSorting
+from entity.DAO import CATALOG_CHANGE_SEQ, StockItem, StockItemHead, Category, ItemSorting, ItemVariant
+from datetime import datetime
 from typing import List
 import service.ItemVariantService as ItemVariantService
 import service.StockItemSortingService as StockItemSortingService
+import service.CatalogCache as CatalogCache
+import service.CatalogVersion as CatalogVersion
+import service.Constraints as Constraints
+import service.StockItemHeadService as StockItemHeadService
+import service.TimeRange as TimeRange
 
-def get_all(db: Session):
+STOCK_ITEM_COLUMNS = (StockItem.id, StockItem.base_item_id, StockItem.category_id, StockItem.name,
+                      StockItem.deposit_amount, StockItem.is_active, StockItem.version, StockItem.change_seq)
+
+def get_all(db: Session, as_of: datetime = None):
+    if as_of is not None: return get_all_as_of(db, as_of)
     # Left join with ItemSorting to get items in sorted order, including items without sorting
     # Items without sorting will have sort_order = NULL and should appear at the end
-    return (db.query(StockItem)
-            .outerjoin(ItemSorting, StockItem.id == ItemSorting.item_id)
-            .filter(StockItem.is_active)
+    return list(CatalogCache.get("stock_items", lambda: tuple(
+        db.query(*STOCK_ITEM_COLUMNS)
+        .outerjoin(ItemSorting, StockItem.id == ItemSorting.item_id)
+        .filter(StockItem.is_active)
+        .order_by(ItemSorting.sort_order.nullslast(), StockItem.id))))
+
+def get_all_as_of(db: Session, as_of: datetime):
+    # Die Versionen, die zum Zeitpunkt gültig waren (z.B. Bill.date), über den GiST-Index auf tsrange(valid_from, valid_to).
+    # Sortiert wie heute: die Sortierung hängt an der aktuellen Version der Linie (stock_item_head).
+    # is_active beschreibt den Zustand zum Zeitpunkt, nicht den heutigen. Nicht gecacht, as_of ist meist einmalig.
+    return (db.query(*STOCK_ITEM_COLUMNS[:5], true().label("is_active"), *STOCK_ITEM_COLUMNS[6:])
+            .outerjoin(StockItemHead, StockItemHead.base_item_id == StockItemHeadService.LINEAGE)
+            .outerjoin(ItemSorting, ItemSorting.item_id == StockItemHead.current_item_id)
+            .filter(TimeRange.valid_at(StockItem, as_of))
             .order_by(ItemSorting.sort_order.nullslast(), StockItem.id)
             .all())
 
 def get_by_id(db: Session, item_id: int):
-    item = db.query(StockItem).filter(StockItem.is_active, StockItem.id == item_id).first()
+    item = CatalogCache.get(("stock_item", item_id), lambda: db.query(*STOCK_ITEM_COLUMNS).filter(StockItem.is_active, StockItem.id == item_id).first())
     if not item: raise HTTPException(status_code=404, detail="Artikel nicht gefunden")
     return item
 
-def create(db: Session, name: str, category_id: int, deposit_amount: float = 0.0, exclude_item_id: int = None):
+def create(db: Session, name: str, category_id: int, deposit_amount: float = 0.0):
     if name is None or not name or name.strip() == "" or name.__len__() > 50: raise HTTPException(status_code=400, detail="Name darf nicht leer sein")
-    
-    # Duplikatsprüfung mit optionalem Ausschluss eines Items (für Updates)
-    duplicate_query = db.query(StockItem).filter(
-        StockItem.name == name, 
-        StockItem.category_id == category_id, 
-        StockItem.is_active
-    )
-    if exclude_item_id is not None:
-        duplicate_query = duplicate_query.filter(StockItem.id != exclude_item_id)
-    
-    if duplicate_query.first(): 
-        raise HTTPException(status_code=400, detail="Artikel mit diesem Namen existiert bereits in dieser Kategorie und ist aktiv")
-    
+    # Gleichnamige aktive Artikel in der Kategorie verhindert ux_stock_item_live_category, siehe Constraints
     if not db.query(Category).filter(Category.id == category_id).first(): raise HTTPException(status_code=404, detail="Kategorie nicht gefunden")
     
     # Erstelle neues StockItem mit Version 1 (base_item_id bleibt None für das Original)
     item = StockItem(name=name, category_id=category_id, deposit_amount=deposit_amount, is_active=True, version=1)
     db.add(item)
     try:
+        db.flush()
+        StockItemHeadService.advance(db, [{"base_item_id": item.id, "current_item_id": item.id, "version": 1}])
         db.commit()
         db.refresh(item)
         StockItemSortingService.add_item_to_sorting( db, item_id=item.id, sort_order=db.query(StockItemSortingService.ItemSorting).count() )
         return item
     except IntegrityError as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail=f"Integritätsfehler: Artikel konnte nicht erstellt werden: {str(e)}")
+        raise HTTPException(status_code=400, detail=Constraints.message(e, f"Integritätsfehler: Artikel konnte nicht erstellt werden: {str(e)}"))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Fehler bei der Erstellung des Artikels: {str(e)}")
     
-def update(db: Session, item_id: int, name: str = None, category_id: int = None, deposit_amount: float = None):
+def update_with_variants(db: Session, item_id: int, name: str = None, category_id: int = None, deposit_amount: float = None, variants: List[dict] = None):
+    # Neue Version des Artikels samt aller Varianten in einer Transaktion. Varianten mit positiver ID werden
+    # als neue Version übernommen, ohne ID neu angelegt; nicht mehr aufgeführte Varianten werden deaktiviert.
+    if variants is None: variants = []
     item = db.query(StockItem).filter(StockItem.id == item_id).first()
     if not item: raise HTTPException(status_code=404, detail="Artikel nicht gefunden")
     if name is None or not name or name.strip() == "": raise HTTPException(status_code=400, detail="Name darf nicht leer sein")
     if category_id is not None and not db.query(Category).filter(Category.id == category_id).first(): raise HTTPException(status_code=404, detail="Kategorie nicht gefunden")
-    
-    # Bestimme die finale Kategorie-ID und deposit_amount
+
     final_category_id = category_id if category_id is not None else item.category_id
-    final_name = name if name is not None else item.name
     final_deposit_amount = deposit_amount if deposit_amount is not None else item.deposit_amount
-    
-    # Duplikatsprüfung - exclude nur den aktuellen Artikel
-    duplicate = db.query(StockItem).filter(
-        StockItem.name == final_name, 
-        StockItem.category_id == final_category_id, 
-        StockItem.is_active,
-        StockItem.id != item_id
-    ).first()
-    
-    if duplicate:
-        raise HTTPException(status_code=400, detail="Artikel mit diesem Namen existiert bereits in dieser Kategorie und ist aktiv")
-    
-    # Bestimme base_item_id und neue Version
-    if item.base_item_id:
-        # Item ist bereits eine Version
-        base_item_id = item.base_item_id
-    else:
-        # Item ist das Original, verwende seine ID als base_item_id
-        base_item_id = item.id
-    
-    # Finde die höchste Version für diese base_item_id
-    max_version = db.query(StockItem).filter(
-        (StockItem.base_item_id == base_item_id) | (StockItem.id == base_item_id)
-    ).order_by(StockItem.version.desc().nullslast()).first()
-    
-    new_version = (max_version.version or 0) + 1 if max_version else 1
-    
-    # Erstelle neue Version
+
+    # Bisherige Varianten: aktive des Artikels und alle in der Anfrage referenzierten, in einer Query
+    variant_ids = [v["id"] for v in variants if v.get("id") and v["id"] > 0]
+    old_variants = {v.id: v for v in db.query(ItemVariant).filter(
+        ItemVariant.id.in_(variant_ids) | ((ItemVariant.stock_item_id == item_id) & ItemVariant.is_active))}
+    new_data = []
+    for v in variants:
+        data = {"name": v.get("name"), "price": v.get("price"), "bill_steps": v.get("bill_steps"), "version": 1}
+        if v.get("id") and v["id"] > 0:
+            old = old_variants.get(v["id"])
+            if not old: raise HTTPException(status_code=404, detail="Variante nicht gefunden")
+            if not old.is_active: raise HTTPException(status_code=400, detail="Inaktive Variante kann nicht bearbeitet werden")
+            if data["name"] is None: data["name"] = old.name
+            data["version"] = (old.version or 1) + 1
+        new_data.append(data)
+    ItemVariantService.validate_all(new_data)
+
+    base_item_id = StockItemHeadService.base_id(item)
     new_item = StockItem(
-        name=final_name,
+        name=name,
         category_id=final_category_id,
         deposit_amount=final_deposit_amount,
         base_item_id=base_item_id,
-        version=new_version,
+        version=(StockItemHeadService.lock_versions(db, [base_item_id]).get(base_item_id) or 0) + 1,
         is_active=True
     )
-    
-    # Deaktiviere alte Version
-    item.is_active = False
-    db.add(new_item)
+    new_variants = [ItemVariant(stock_item=new_item, is_active=True, **data) for data in new_data]
+    sorting = db.query(ItemSorting).filter(ItemSorting.item_id == item_id).first()
     try:
+        # Alle bisherigen Varianten mit einem UPDATE deaktivieren (siehe bulk_update)
+        CatalogVersion.lock_changes(db)
+        if old_variants:
+            db.query(ItemVariant).filter(ItemVariant.id.in_(old_variants.keys())).update(
+                {"is_active": False, "change_seq": CATALOG_CHANGE_SEQ.next_value(), "valid_to": CatalogVersion.version_time(db)}, synchronize_session="fetch")
+            CatalogVersion.record_deactivated(db, ItemVariant, old_variants.keys())
+        item.is_active = False
+        db.add_all([new_item, *new_variants])
+        db.flush()
+        StockItemHeadService.advance(db, [{"base_item_id": base_item_id, "current_item_id": new_item.id, "version": new_item.version}])
+        if sorting: sorting.item_id = new_item.id
+        new_item_id = new_item.id
         db.commit()
-        db.refresh(new_item)
-        
-        # Update ItemSorting - verwende base_item_id für Sortierung
-        sorting = db.query(ItemSorting).filter(ItemSorting.item_id == item_id).first()
-        if sorting:
-            # Entferne alte Sortierung und erstelle neue mit neuer item_id
-            db.delete(sorting)
-            new_sorting = ItemSorting(item_id=new_item.id, sort_order=sorting.sort_order)
-            db.add(new_sorting)
-            db.commit()
-        
-        return new_item
     except IntegrityError as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail=f"Integritätsfehler: Artikel konnte nicht aktualisiert werden: {str(e)}")
+        raise HTTPException(status_code=400, detail=Constraints.message(e, f"Integritätsfehler: Artikel konnte nicht aktualisiert werden: {str(e)}"))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Fehler bei der Aktualisierung des Artikels: {str(e)}")
-    
-def bulk_update(db: Session, items: List[StockItem]):
-    updated_items = []
+    return get_by_id(db, new_item_id)
+
+def bulk_update(db: Session, items: List[dict]):
+    # Mengenbasiert und in einer Transaktion: alle Artikel mit einer Query laden, alle neuen Versionen
+    # (samt ihrer aktiven Varianten) in einem Flush anlegen, einmal committen. Schlägt ein Eintrag fehl,
+    # bleibt der Katalog unverändert.
+    ids = [item_data.get("id") for item_data in items]
+    if len(set(ids)) != len(ids): raise HTTPException(status_code=400, detail="Artikel mehrfach in der Liste enthalten")
+    loaded = {item.id: item for item in db.query(StockItem).filter(StockItem.id.in_(ids))}
+    changes = {}
     for item_data in items:
         item_id = item_data.get("id")
         name = item_data.get("name")
         category_id = item_data.get("category_id")
 
-        item = db.query(StockItem).filter(StockItem.id == item_id).first()
+        item = loaded.get(item_id)
         if not item: raise HTTPException(status_code=404, detail=f"Artikel mit ID {item_id} nicht gefunden")
         if not item.is_active: raise HTTPException(status_code=400, detail=f"Inaktiver Artikel mit ID {item_id} kann nicht aktualisiert werden")
 
@@ -138,25 +146,87 @@ def bulk_update(db: Session, items: List[StockItem]):
             (name is not None and name != item.name) or
             (category_id is not None and category_id != item.category_id)
         )
-        if changed:
-            updated_item = update(db, item_id, name, category_id)
-            updated_items.append(updated_item)
-        else:
-            updated_items.append(item)
-    return updated_items
+        if not changed: continue
+        if name is None or not name or name.strip() == "": raise HTTPException(status_code=400, detail="Name darf nicht leer sein")
+        changes[item_id] = (name, category_id if category_id is not None else item.category_id)
+    if not changes: return [loaded[item_id] for item_id in ids]
 
-def get_all_in_category(db: Session, category_id: int):
-    if not db.query(Category).filter(Category.id == category_id).first(): 
+    category_ids = {category_id for _, category_id in changes.values()}
+    if db.query(func.count(Category.id)).filter(Category.id.in_(category_ids)).scalar() != len(category_ids):
         raise HTTPException(status_code=404, detail="Kategorie nicht gefunden")
-    if not db.query(StockItem).filter(StockItem.category_id == category_id, StockItem.is_active).first(): 
-        raise HTTPException(status_code=400, detail="Kein Item in dieser Kategorie gefunden")
-    
+
+    # Duplikate untereinander; gegen die übrigen aktiven Artikel prüft ux_stock_item_live_category
+    targets = list(changes.values())
+    if len(set(targets)) != len(targets): raise HTTPException(status_code=400, detail="Artikel mit diesem Namen existiert bereits in dieser Kategorie und ist aktiv")
+
+    # Aktuelle Version je base_item_id über die Kopfzeiger, in einer Query
+    base_ids = {item_id: StockItemHeadService.base_id(loaded[item_id]) for item_id in changes}
+    max_versions = StockItemHeadService.lock_versions(db, base_ids.values())
+    variants = db.query(ItemVariant).filter(ItemVariant.stock_item_id.in_(changes.keys()), ItemVariant.is_active).order_by(ItemVariant.id).all()
+    sortings = {sorting.item_id: sorting for sorting in db.query(ItemSorting).filter(ItemSorting.item_id.in_(changes.keys()))}
+
+    new_items = {}
+    for item_id, (name, category_id) in changes.items():
+        item = loaded[item_id]
+        new_items[item_id] = StockItem(
+            name=name,
+            category_id=category_id,
+            deposit_amount=item.deposit_amount,
+            base_item_id=base_ids[item_id],
+            version=(max_versions.get(base_ids[item_id]) or 0) + 1,
+            is_active=True
+        )
+    # Varianten ziehen mit um, wie beim Einzel-Update über PUT /stock-items/{id}
+    new_variants = [ItemVariant(
+        stock_item=new_items[variant.stock_item_id],
+        name=variant.name,
+        price=variant.price,
+        bill_steps=variant.bill_steps,
+        version=(variant.version or 1) + 1,
+        is_active=True
+    ) for variant in variants]
+    try:
+        # Alte Versionen mit je einem UPDATE deaktivieren (pro Objekt wären es einzelne Statements,
+        # weil change_seq ein SQL-Ausdruck ist), danach die neuen Versionen in einem Flush einfügen
+        CatalogVersion.lock_changes(db)
+        variant_ids = [variant.id for variant in variants]
+        db.query(StockItem).filter(StockItem.id.in_(changes.keys())).update(
+            {"is_active": False, "change_seq": CATALOG_CHANGE_SEQ.next_value(), "valid_to": CatalogVersion.version_time(db)}, synchronize_session="fetch")
+        if variant_ids:
+            db.query(ItemVariant).filter(ItemVariant.id.in_(variant_ids)).update(
+                {"is_active": False, "change_seq": CATALOG_CHANGE_SEQ.next_value(), "valid_to": CatalogVersion.version_time(db)}, synchronize_session="fetch")
+        CatalogVersion.record_deactivated(db, StockItem, changes.keys())
+        CatalogVersion.record_deactivated(db, ItemVariant, variant_ids)
+        db.add_all([*new_items.values(), *new_variants])
+        db.flush()
+        StockItemHeadService.advance(db, [
+            {"base_item_id": new_item.base_item_id, "current_item_id": new_item.id, "version": new_item.version} for new_item in new_items.values()
+        ])
+        for item_id, sorting in sortings.items(): sorting.item_id = new_items[item_id].id
+        result_ids = [new_items[item_id].id if item_id in new_items else item_id for item_id in ids]
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=Constraints.message(e, f"Integritätsfehler: Artikel konnten nicht aktualisiert werden: {str(e)}"))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Fehler bei der Aktualisierung der Artikel: {str(e)}")
+    # Nach dem Commit sind alle Objekte expired: mit einer Query neu laden statt einzeln per Refresh
+    result = {item.id: item for item in db.query(StockItem).filter(StockItem.id.in_(result_ids))}
+    return [result[item_id] for item_id in result_ids]
+
+def get_all_in_category(db: Session, category_id: int):
     # Left join with ItemSorting to get items in sorted order within the category
-    return (db.query(StockItem)
-            .outerjoin(ItemSorting, StockItem.id == ItemSorting.item_id)
-            .filter(StockItem.category_id == category_id, StockItem.is_active)
-            .order_by(ItemSorting.sort_order.nullslast(), StockItem.id)
-            .all())
+    items = list(CatalogCache.get(("stock_items_in_category", category_id), lambda: tuple(
+        db.query(*STOCK_ITEM_COLUMNS)
+        .outerjoin(ItemSorting, StockItem.id == ItemSorting.item_id)
+        .filter(StockItem.category_id == category_id, StockItem.is_active)
+        .order_by(ItemSorting.sort_order.nullslast(), StockItem.id))))
+    if items: return items
+    # Nur bei leerer Liste unterscheiden, ob es die Kategorie überhaupt gibt
+    if not db.query(Category.id).filter(Category.id == category_id).first():
+        raise HTTPException(status_code=404, detail="Kategorie nicht gefunden")
+    raise HTTPException(status_code=400, detail="Kein Item in dieser Kategorie gefunden")
 
 def delete(db: Session, item_id: int):
     item = db.query(StockItem).filter(StockItem.id == item_id).first()
@@ -0,0 +1,34 @@
+from datetime import date, datetime, timedelta
+from typing import Union
+from sqlalchemy import func
+
+# Zeitfilter für Zeitstempel-Spalten. Ein reines Datum steht für den ganzen Tag, ein Zeitpunkt gilt exakt.
+# Der Bereich ist halboffen: date_from inklusive, date_to bei Zeitpunkten exklusiv bzw. bei Tagen inklusive
+# des ganzen Tages. So bleibt jeder Filter eine einfache Bereichsabfrage auf dem Index der Spalte.
+
+DateOrTime = Union[date, datetime]
+
+def is_whole_days(date_from: DateOrTime = None, date_to: DateOrTime = None) -> bool:
+    return not isinstance(date_from, datetime) and not isinstance(date_to, datetime)
+
+def naive(value: datetime) -> datetime:
+    # Zeitstempel werden ohne Zeitzone in lokaler Zeit gespeichert
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+
+def lower_bound(value: DateOrTime) -> datetime:
+    if isinstance(value, datetime): return naive(value)
+    return datetime.combine(value, datetime.min.time())
+
+def upper_bound(value: DateOrTime) -> datetime:
+    if isinstance(value, datetime): return naive(value)
+    return datetime.combine(value + timedelta(days=1), datetime.min.time())
+
+def valid_at(entity, as_of: datetime):
+    # Versionen (StockItem, ItemVariant), die zum Zeitpunkt gültig waren; derselbe Ausdruck wie der GiST-Index
+    # ix_<tabelle>_validity, sonst wird der Index nicht genutzt
+    return func.tsrange(entity.valid_from, entity.valid_to).op("@>")(naive(as_of))
+
+def apply(query, column, date_from: DateOrTime = None, date_to: DateOrTime = None):
+    if date_from is not None: query = query.filter(column >= lower_bound(date_from))
+    if date_to is not None: query = query.filter(column < upper_bound(date_to))
+    return query
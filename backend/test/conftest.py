@@ -0,0 +1,17 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Gemeinsame Hilfsfunktionen der Testmodule
+
+# Auf der Engine-Klasse lauschen: get_db ist ggf. von einem anderen Testmodul mit eigener Engine überschrieben
+@contextmanager
+def count_queries():
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
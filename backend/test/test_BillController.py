@@ -1,14 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
+import threading
+import time
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from app import app
 from database import get_db
-from entity.DAO import Base
+from conftest import count_queries
+from entity.DAO import Base, SalesDailyRollup
+import service.SalesRollupService as SalesRollupService
+import service.BillIngestQueue as BillIngestQueue
 
 TEST_DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres_db")
 SQLALCHEMY_TEST_DATABASE_URL = f"postgresql://root:root@{TEST_DATABASE_HOST}:5432/huettenzauber_test"
@@ -265,4 +271,377 @@ def test_soft_delete_one_of_many():
     assert response.status_code == 200
     # bill_id1 darf nicht mehr abrufbar sein
     response = client.get(f"/bills/{bill_id1}")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+# 26. Ungültige Variante in einer Mehrfach-Rechnung legt keine (Teil-)Rechnung an
+def test_create_bill_with_one_invalid_variant_is_atomic():
+    payload = create_bill_payload(n_items=2)
+    payload["items"].append({"item_variant_id": 999999, "item_quantity": 1})
+    response = client.post("/bills/", json=payload)
+    assert response.status_code == 400
+    assert client.get("/bills/all").json() == []
+
+# 27. Keyset-Pagination liefert alle Bills genau einmal, neueste zuerst
+def test_list_bills_paginated():
+    payload = create_bill_payload()
+    ids = [client.post("/bills/", json=payload).json()["id"] for _ in range(5)]
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor: params["cursor"] = cursor
+        response = client.get("/bills/", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        seen += [b["id"] for b in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor: break
+    assert seen == sorted(ids, reverse=True)
+
+# 28. Ungültiger Cursor
+def test_list_bills_invalid_cursor():
+    response = client.get("/bills/", params={"limit": 2, "cursor": "kaputt"})
+    assert response.status_code == 400
+
+# 29. Datumsfilter
+def test_list_bills_date_filter():
+    payload = create_bill_payload()
+    client.post("/bills/", json=payload)
+    today = date.today()
+    assert len(client.get("/bills/", params={"date_from": today.isoformat(), "date_to": today.isoformat()}).json()) == 1
+    assert client.get("/bills/", params={"date_to": (today - timedelta(days=1)).isoformat()}).json() == []
+    assert client.get("/bills/", params={"date_from": (today + timedelta(days=1)).isoformat()}).json() == []
+
+# 30. /bills/all mit Filter auf gelöschte bzw. nicht gelöschte Bills
+def test_all_bills_deleted_filter():
+    payload = create_bill_payload()
+    bill_id1 = client.post("/bills/", json=payload).json()["id"]
+    bill_id2 = client.post("/bills/", json=payload).json()["id"]
+    client.delete(f"/bills/{bill_id1}")
+    assert [b["id"] for b in client.get("/bills/all", params={"is_deleted": True}).json()] == [bill_id1]
+    assert [b["id"] for b in client.get("/bills/all", params={"is_deleted": False}).json()] == [bill_id2]
+
+
+# 31. Bill-Items werden gesammelt geladen: die Anzahl der Queries hängt nicht von der Anzahl der Bills ab
+@pytest.mark.parametrize("url", ["/bills/", "/bills/all", "/bills/?limit=100"])
+def test_list_bills_query_count_is_constant(url):
+    payload = create_bill_payload(n_items=2)
+    client.post("/bills/", json=payload)
+    with count_queries() as few:
+        assert len(client.get(url).json()) == 1
+    for _ in range(10):
+        client.post("/bills/", json=payload)
+    with count_queries() as many:
+        assert len(client.get(url).json()) == 11
+    assert len(many) == len(few)
+    assert len(many) <= 2
+
+# 32. Einzelne Bill mit Items in konstanter Anzahl Queries
+def test_get_bill_query_count():
+    payload = create_bill_payload(n_items=5)
+    bill_id = client.post("/bills/", json=payload).json()["id"]
+    with count_queries() as statements:
+        assert len(client.get(f"/bills/{bill_id}").json()["items"]) == 5
+    assert len(statements) <= 2
+
+# 33. Verkaufsstatistik: Menge und Umsatz je Variante, gelöschte Bills ausgenommen
+def test_sales_stats():
+    cat_id = create_category(name="StatsCat")
+    _, variant_a = create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    _, variant_b = create_stock_item("Brezel", cat_id, [{"price": 2.0, "bill_steps": 1.0}])
+    client.post("/bills/", json={"items": [{"item_variant_id": variant_a, "item_quantity": 2}, {"item_variant_id": variant_b, "item_quantity": 1}]})
+    client.post("/bills/", json={"items": [{"item_variant_id": variant_a, "item_quantity": 1}]})
+    deleted_id = client.post("/bills/", json={"items": [{"item_variant_id": variant_b, "item_quantity": 5}]}).json()["id"]
+    client.delete(f"/bills/{deleted_id}")
+    response = client.get("/bills/stats")
+    assert response.status_code == 200
+    stats = {s["item_variant_id"]: s for s in response.json()}
+    assert stats[variant_a]["quantity"] == 3
+    assert stats[variant_a]["revenue"] == pytest.approx(13.5)
+    assert stats[variant_a]["stock_item_name"] == "Bier"
+    assert stats[variant_a]["category_name"] == "StatsCat"
+    assert stats[variant_b]["quantity"] == 1
+    assert stats[variant_b]["variant_name"] == "1.0"
+    with_deleted = {s["item_variant_id"]: s for s in client.get("/bills/stats", params={"include_deleted": True}).json()}
+    assert with_deleted[variant_b]["quantity"] == 6
+
+# 34. Verkaufsstatistik mit Datumsbereich
+def test_sales_stats_date_range():
+    payload = create_bill_payload()
+    client.post("/bills/", json=payload)
+    today = date.today()
+    assert len(client.get("/bills/stats", params={"date_from": today.isoformat(), "date_to": today.isoformat()}).json()) == 1
+    assert client.get("/bills/stats", params={"date_from": (today + timedelta(days=1)).isoformat()}).json() == []
+
+
+# 35. Tagessummen werden bei Anlage und Löschung mitgeführt und lassen sich neu aufbauen
+def test_sales_rollup_maintained_and_rebuilt():
+    cat_id = create_category(name="RollupCat")
+    _, variant_id = create_stock_item("Radler", cat_id, [{"name": "0,5l", "price": 4.0, "bill_steps": 1.0}])
+    client.post("/bills/", json={"items": [{"item_variant_id": variant_id, "item_quantity": 2}, {"item_variant_id": variant_id, "item_quantity": 1}]})
+    bill_id = client.post("/bills/", json={"items": [{"item_variant_id": variant_id, "item_quantity": 4}]}).json()["id"]
+    db = TestingSessionLocal()
+    try:
+        def rollup():
+            db.expire_all()
+            return [(r.day, r.item_variant_id, r.quantity, r.revenue) for r in db.query(SalesDailyRollup).all()]
+        assert rollup() == [(date.today(), variant_id, 7, 28.0)]
+        client.delete(f"/bills/{bill_id}")
+        client.delete(f"/bills/{bill_id}")
+        assert rollup() == [(date.today(), variant_id, 3, 12.0)]
+        db.query(SalesDailyRollup).delete()
+        db.commit()
+        SalesRollupService.rebuild(db)
+        assert rollup() == [(date.today(), variant_id, 3, 12.0)]
+    finally:
+        db.close()
+
+# 35b. Gleichzeitige Löschungen derselben Rechnung ziehen die Tagessummen nur einmal ab
+def test_concurrent_delete_subtracts_rollup_once():
+    cat_id = create_category(name="RollupCat")
+    _, variant_id = create_stock_item("Radler", cat_id, [{"name": "0,5l", "price": 4.0, "bill_steps": 1.0}])
+    client.post("/bills/", json={"items": [{"item_variant_id": variant_id, "item_quantity": 3}]})
+    bill_id = client.post("/bills/", json={"items": [{"item_variant_id": variant_id, "item_quantity": 4}]}).json()["id"]
+    db = TestingSessionLocal()
+    try:
+        # Die Rechnung gesperrt halten, bis beide Löschungen warten
+        db.execute(text("SELECT id FROM bill WHERE id = :id FOR UPDATE"), {"id": bill_id})
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            responses = [pool.submit(client.delete, f"/bills/{bill_id}") for _ in range(2)]
+            time.sleep(0.5)
+            db.rollback()
+            assert [r.result().status_code for r in responses] == [204, 204]
+        assert [(r.quantity, r.revenue) for r in db.query(SalesDailyRollup).all()] == [(3, 12.0)]
+    finally:
+        db.close()
+
+# 36. Export als CSV, NDJSON und XLSX
+def test_export_bills_csv():
+    payload = create_bill_payload(n_items=2)
+    bill_id = client.post("/bills/", json=payload).json()["id"]
+    response = client.get("/bills/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.content.decode("utf-8-sig").strip().splitlines()
+    assert lines[0] == "bill_id,date,is_deleted,category,stock_item,variant,item_quantity,price,deposit_amount,revenue"
+    assert len(lines) == 3
+    assert lines[1].startswith(f"{bill_id},")
+
+def test_export_bills_ndjson_excludes_deleted():
+    payload = create_bill_payload()
+    bill_id1 = client.post("/bills/", json=payload).json()["id"]
+    bill_id2 = client.post("/bills/", json=payload).json()["id"]
+    client.delete(f"/bills/{bill_id1}")
+    import json
+    rows = [json.loads(line) for line in client.get("/bills/export", params={"format": "ndjson"}).text.splitlines()]
+    assert [r["bill_id"] for r in rows] == [bill_id2]
+    rows = [json.loads(line) for line in client.get("/bills/export", params={"format": "ndjson", "include_deleted": True}).text.splitlines()]
+    assert sorted(r["bill_id"] for r in rows) == [bill_id1, bill_id2]
+
+def test_export_bills_xlsx():
+    import io
+    import zipfile
+    payload = create_bill_payload(n_items=3)
+    client.post("/bills/", json=payload)
+    response = client.get("/bills/export", params={"format": "xlsx"})
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    assert archive.read("xl/worksheets/sheet1.xml").count(b"<row>") == 4
+
+def test_export_bills_invalid_format():
+    response = client.get("/bills/export", params={"format": "pdf"})
+    assert response.status_code == 422
+
+
+# 37. Write-Behind-Modus: Bills werden gesammelt geschrieben und sind nach der Antwort lesbar
+@pytest.mark.parametrize("durability", ["commit", "async_commit"])
+def test_create_bill_queued(durability):
+    payload = create_bill_payload(n_items=2)
+    BillIngestQueue.start(TestingSessionLocal, flush_interval_ms=5, durability=durability, id_block_size=3)
+    try:
+        posted = [client.post("/bills/", json=payload) for _ in range(5)]
+    finally:
+        BillIngestQueue.stop()
+    assert all(p.status_code == 201 for p in posted)
+    ids = [p.json()["id"] for p in posted]
+    assert len(set(ids)) == 5
+    for bill_id in ids:
+        response = client.get(f"/bills/{bill_id}")
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == 2
+    # Direkte Anlage danach vergibt weiterhin eindeutige IDs aus derselben Sequenz
+    assert client.post("/bills/", json=payload).json()["id"] not in ids
+
+def test_create_bill_queued_enqueue_flushes_on_stop():
+    payload = create_bill_payload()
+    BillIngestQueue.start(TestingSessionLocal, flush_interval_ms=5, durability="enqueue")
+    try:
+        ids = [client.post("/bills/", json=payload).json()["id"] for _ in range(3)]
+    finally:
+        BillIngestQueue.stop()
+    assert sorted(b["id"] for b in client.get("/bills/").json()) == sorted(ids)
+
+def test_create_bill_queued_validates_before_enqueue():
+    BillIngestQueue.start(TestingSessionLocal, flush_interval_ms=5)
+    try:
+        response = client.post("/bills/", json={"items": [{"item_variant_id": 999999, "item_quantity": 1}]})
+    finally:
+        BillIngestQueue.stop()
+    assert response.status_code == 400
+
+# Mehr wartende Requests als der Pool Verbindungen hat (5 + 10 Overflow): der Flusher muss trotzdem schreiben können
+def test_create_bill_queued_more_requests_than_pool():
+    payload = create_bill_payload()
+    BillIngestQueue.start(TestingSessionLocal, flush_interval_ms=50)
+    try:
+        with ThreadPoolExecutor(max_workers=25) as pool:
+            posted = list(pool.map(lambda _: client.post("/bills/", json=payload), range(25)))
+    finally:
+        BillIngestQueue.stop()
+    assert [p.status_code for p in posted] == [201] * 25
+    assert len(client.get("/bills/").json()) == 25
+
+def test_create_bill_queued_rejected_while_stopping(monkeypatch):
+    payload = create_bill_payload()
+    BillIngestQueue.start(TestingSessionLocal, flush_interval_ms=5)
+    # Zwischen _stopping.set() und dem Ende des Flushers nimmt die Queue nichts mehr an
+    joined = threading.Event()
+    flusher = BillIngestQueue._flusher
+    monkeypatch.setattr(flusher, "join", lambda: (joined.wait(5), threading.Thread.join(flusher)))
+    stopper = threading.Thread(target=BillIngestQueue.stop)
+    stopper.start()
+    try:
+        while not BillIngestQueue._stopping.is_set(): time.sleep(0.01)
+        response = client.post("/bills/", json=payload)
+    finally:
+        joined.set()
+        stopper.join()
+    assert response.status_code == 503
+    assert client.get("/bills/").json() == []
+
+# 38. Preis, Pfand und Name werden auf der Rechnungsposition festgehalten und überstehen spätere Änderungen
+def test_bill_item_snapshot_survives_price_change():
+    cat_id = create_category(name="SnapCat")
+    response = client.post("/stock-items/", json={
+        "name": "Weißbier",
+        "category_id": cat_id,
+        "deposit_amount": 2.0,
+        "item_variants": [{"name": "0,5l", "price": 5.0, "bill_steps": 1.0}]
+    })
+    item_id = response.json()["id"]
+    variant_id = response.json()["item_variants"][0]["id"]
+    bill = client.post("/bills/", json={"items": [{"item_variant_id": variant_id, "item_quantity": 2}]}).json()
+    assert bill["items"][0]["item_price"] == 5.0
+    assert bill["items"][0]["item_deposit_amount"] == 2.0
+    assert bill["items"][0]["item_name"] == "Weißbier 0,5l"
+    client.put(f"/stock-items/{item_id}", json={
+        "name": "Weißbier",
+        "category_id": cat_id,
+        "deposit_amount": 3.0,
+        "item_variants": [{"id": variant_id, "name": "0,5l", "price": 6.0, "bill_steps": 1.0}]
+    })
+    item = client.get(f"/bills/{bill['id']}").json()["items"][0]
+    assert (item["item_price"], item["item_deposit_amount"], item["item_name"]) == (5.0, 2.0, "Weißbier 0,5l")
+
+# 39. Rechnungssumme und Pfandsumme werden beim Kassieren gespeichert
+@pytest.mark.parametrize("queued", [False, True])
+def test_bill_totals_persisted(queued):
+    cat_id = create_category(name="TotalCat")
+    response = client.post("/stock-items/", json={
+        "name": "Apfelschorle",
+        "category_id": cat_id,
+        "deposit_amount": 1.5,
+        "item_variants": [{"name": "0,3l", "price": 3.0, "bill_steps": 1.0}, {"name": "0,5l", "price": 4.5, "bill_steps": 1.0}]
+    })
+    variants = [v["id"] for v in response.json()["item_variants"]]
+    payload = {"items": [{"item_variant_id": variants[0], "item_quantity": 2}, {"item_variant_id": variants[1], "item_quantity": 1}]}
+    if queued: BillIngestQueue.start(TestingSessionLocal, flush_interval_ms=5)
+    try:
+        bill = client.post("/bills/", json=payload).json()
+    finally:
+        if queued: BillIngestQueue.stop()
+    assert bill["total_amount"] == pytest.approx(10.5)
+    assert bill["deposit_total"] == pytest.approx(4.5)
+    listed = next(b for b in client.get("/bills/").json() if b["id"] == bill["id"])
+    assert (listed["total_amount"], listed["deposit_total"]) == (pytest.approx(10.5), pytest.approx(4.5))
+
+# 40. Batch-Upload mit Client-IDs: Wiederholungen werden übersprungen
+def test_create_bills_batch_skips_known_client_ids():
+    import uuid
+    payload = create_bill_payload(n_items=2)
+    client_ids = [str(uuid.uuid4()) for _ in range(3)]
+    batch = {"bills": [{"client_id": cid, "date": "2024-07-01T18:30:00", "items": payload["items"]} for cid in client_ids]}
+    response = client.post("/bills/batch", json=batch)
+    assert response.status_code == 200
+    first = response.json()
+    assert [r["client_id"] for r in first] == client_ids
+    assert all(r["created"] for r in first)
+    # Erneuter Upload inkl. einer neuen und einer doppelten Rechnung
+    new_id = str(uuid.uuid4())
+    batch["bills"].append({"client_id": new_id, "items": payload["items"]})
+    batch["bills"].append({"client_id": new_id, "items": payload["items"]})
+    second = client.post("/bills/batch", json=batch).json()
+    assert [r["created"] for r in second] == [False, False, False, True]
+    assert [r["id"] for r in second[:3]] == [r["id"] for r in first]
+    bills = client.get("/bills/").json()
+    assert len(bills) == 4
+    assert all(len(b["items"]) == 2 for b in bills)
+    assert sum(1 for b in bills if b["date"].startswith("2024-07-01T18:30")) == 3
+
+def test_create_bills_batch_invalid_variant_rejects_all():
+    import uuid
+    payload = create_bill_payload()
+    batch = {"bills": [
+        {"client_id": str(uuid.uuid4()), "items": payload["items"]},
+        {"client_id": str(uuid.uuid4()), "items": [{"item_variant_id": 999999, "item_quantity": 1}]},
+    ]}
+    assert client.post("/bills/batch", json=batch).status_code == 400
+    assert client.get("/bills/all").json() == []
+
+# 41. Zeitfenster innerhalb eines Tages: date_from/date_to mit Uhrzeit sind exakt, reine Daten umfassen den ganzen Tag
+def test_list_bills_time_range():
+    import uuid
+    payload = create_bill_payload()
+    times = ["2024-07-01T17:50:00", "2024-07-01T18:05:00", "2024-07-01T18:20:00"]
+    client.post("/bills/batch", json={"bills": [{"client_id": str(uuid.uuid4()), "date": t, "items": payload["items"]} for t in times]})
+    window = client.get("/bills/", params={"date_from": "2024-07-01T18:00:00", "date_to": "2024-07-01T18:20:00"}).json()
+    assert [b["date"] for b in window] == ["2024-07-01T18:05:00"]
+    assert len(client.get("/bills/", params={"date_from": "2024-07-01", "date_to": "2024-07-01"}).json()) == 3
+    assert client.get("/bills/", params={"date_from": "2024-07-01T18:20:01"}).json() == []
+    recent = client.get("/bills/", params={"date_from": (datetime.now() - timedelta(minutes=15)).isoformat()}).json()
+    assert recent == []
+    client.post("/bills/", json=payload)
+    assert len(client.get("/bills/", params={"date_from": (datetime.now() - timedelta(minutes=15)).isoformat()}).json()) == 1
+
+# 42. Statistik über ein Zeitfenster innerhalb eines Tages
+def test_sales_stats_time_range():
+    import uuid
+    cat_id = create_category(name="SchichtCat")
+    _, variant_id = create_stock_item("Glühwein", cat_id, [{"name": "0,2l", "price": 3.0, "bill_steps": 1.0}])
+    bills = [("2024-12-06T16:00:00", 2), ("2024-12-06T19:30:00", 5)]
+    client.post("/bills/batch", json={"bills": [
+        {"client_id": str(uuid.uuid4()), "date": t, "items": [{"item_variant_id": variant_id, "item_quantity": q}]} for t, q in bills
+    ]})
+    evening = client.get("/bills/stats", params={"date_from": "2024-12-06T18:00:00", "date_to": "2024-12-07T02:00:00"}).json()
+    assert [(s["quantity"], s["revenue"]) for s in evening] == [(5, pytest.approx(15.0))]
+    whole_day = client.get("/bills/stats", params={"date_from": "2024-12-06", "date_to": "2024-12-06"}).json()
+    assert [s["quantity"] for s in whole_day] == [7]
+
+# 43. ETag auf den Rechnungs-Endpunkten: 304 ohne Datenbankzugriff, neues ETag nach Anlage und Löschung
+@pytest.mark.parametrize("url", ["/bills/", "/bills/all", "/bills/stats", "/bills/{bill_id}"])
+def test_bills_etag(url):
+    payload = create_bill_payload()
+    bill_id = client.post("/bills/", json=payload).json()["id"]
+    url = url.format(bill_id=bill_id)
+    etag = client.get(url).headers["ETag"]
+    with count_queries() as statements:
+        response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert statements == []
+    client.post("/bills/", json=payload)
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    client.delete(f"/bills/{bill_id}")
+    assert client.get(url, headers={"If-None-Match": etag}).status_code != 304
@@ -0,0 +1,433 @@
+import asyncio
+import json
+from datetime import datetime
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app
+from database import get_db
+from conftest import count_queries
+from entity.DAO import Base
+import service.CatalogVersion as CatalogVersion
+import service.CatalogCache as CatalogCache
+import service.CatalogEvents as CatalogEvents
+import service.ItemVariantService as ItemVariantService
+import controller.CatalogController as CatalogController
+
+TEST_DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres_db")
+SQLALCHEMY_TEST_DATABASE_URL = f"postgresql://root:root@{TEST_DATABASE_HOST}:5432/huettenzauber_test"
+engine = create_engine(SQLALCHEMY_TEST_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+@pytest.fixture(autouse=True)
+def setup_and_teardown():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+client = TestClient(app)
+
+def create_category(name="TestCat", icon="MdTest"):
+    response = client.post("/categories/", json={"name": name, "icon": icon})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def create_stock_item(name, category_id, variants, deposit_amount=0.0):
+    response = client.post("/stock-items/", json={"name": name, "category_id": category_id, "deposit_amount": deposit_amount, "item_variants": variants})
+    assert response.status_code == 201
+    return response.json()
+
+# 1. Leerer Katalog
+def test_catalog_empty():
+    response = client.get("/catalog/")
+    assert response.status_code == 200
+    assert response.json() == {"change_cursor": 0, "categories": [], "category_sorting": [], "stock_items": [], "item_sorting": []}
+
+# 2. Katalog enthält Kategorien, Sortierungen, Artikel und Varianten in einer Antwort
+def test_catalog_contents():
+    getraenke = create_category("Getränke", "MdLocalBar")
+    essen = create_category("Essen", "MdRestaurant")
+    bier = create_stock_item("Bier", getraenke, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}, {"price": 2.5, "bill_steps": 0.5}], deposit_amount=2.0)
+    brezel = create_stock_item("Brezel", essen, [{"name": "groß", "price": 3.0, "bill_steps": 1.0}])
+    catalog = client.get("/catalog/").json()
+    assert catalog["categories"] == client.get("/categories/").json()
+    assert catalog["category_sorting"] == client.get("/category-sorting/").json()
+    assert catalog["item_sorting"] == client.get("/item-sorting/").json()
+    assert [i["id"] for i in catalog["stock_items"]] == [bier["id"], brezel["id"]]
+    assert catalog["stock_items"] == client.get("/stock-items/").json()
+    assert [v["name"] for v in catalog["stock_items"][0]["item_variants"]] == ["0,5l", "0.5"]
+    assert catalog["stock_items"][0]["deposit_amount"] == 2.0
+
+# 3. Inaktive Artikel und Varianten fehlen im Katalog
+def test_catalog_only_active():
+    cat_id = create_category()
+    bier = create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}, {"name": "0,3l", "price": 3.0, "bill_steps": 1.0}])
+    radler = create_stock_item("Radler", cat_id, [{"name": "0,5l", "price": 4.0, "bill_steps": 1.0}])
+    client.delete(f"/stock-items/{radler['id']}")
+    variant = bier["item_variants"][0]
+    client.put(f"/stock-items/{bier['id']}", json={"name": "Bier", "category_id": cat_id, "item_variants": [
+        {"id": variant["id"], "name": "0,5l", "price": 5.0, "bill_steps": 1.0},
+    ]})
+    catalog = client.get("/catalog/").json()
+    assert [i["name"] for i in catalog["stock_items"]] == ["Bier"]
+    assert [(v["name"], v["price"]) for v in catalog["stock_items"][0]["item_variants"]] == [("0,5l", 5.0)]
+
+# 4. Wiederholte Abrufe kommen aus dem Speicher, ohne Datenbankzugriff
+def test_catalog_cached_without_queries():
+    cat_id = create_category()
+    create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    first = client.get("/catalog/")
+    with count_queries() as statements:
+        second = client.get("/catalog/")
+    assert statements == []
+    assert second.content == first.content
+    assert second.headers["content-type"] == "application/json"
+
+# 5. Jede Katalogänderung invalidiert den Cache
+def test_catalog_invalidated_on_change():
+    cat_id = create_category()
+    item = create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    assert [i["name"] for i in client.get("/catalog/").json()["stock_items"]] == ["Bier"]
+    create_stock_item("Radler", cat_id, [{"name": "0,5l", "price": 4.0, "bill_steps": 1.0}])
+    assert [i["name"] for i in client.get("/catalog/").json()["stock_items"]] == ["Bier", "Radler"]
+    client.put(f"/categories/{cat_id}", json={"name": "Getränke", "icon": "MdLocalBar"})
+    assert client.get("/catalog/").json()["categories"][0]["name"] == "Getränke"
+    client.delete(f"/stock-items/{item['id']}")
+    assert [i["name"] for i in client.get("/catalog/").json()["stock_items"]] == ["Radler"]
+
+# 6. Fehlgeschlagene Änderungen und Rechnungen lassen den Cache stehen
+def test_catalog_cache_survives_unrelated_writes():
+    cat_id = create_category()
+    item = create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    client.get("/catalog/")
+    version = CatalogVersion.current()
+    assert client.post("/categories/", json={"name": "TestCat", "icon": "MdTest"}).status_code == 400
+    client.post("/bills/", json={"items": [{"item_variant_id": item["item_variants"][0]["id"], "item_quantity": 1}]})
+    assert CatalogVersion.current() == version
+
+# 7. Katalog-Lesepfade kommen bis zur nächsten Änderung aus dem Cache
+@pytest.mark.parametrize("url", ["/categories/", "/stock-items/", "/catalog/"])
+def test_catalog_reads_cached(url):
+    cat_id = create_category()
+    create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    first = client.get(url).json()
+    with count_queries() as statements:
+        assert client.get(url).json() == first
+    assert statements == []
+    create_stock_item("Brezel", create_category("Essen"), [{"name": "groß", "price": 3.0, "bill_steps": 1.0}])
+    with count_queries() as statements:
+        assert client.get(url).json() != first
+    assert statements
+
+# 8. Treffer und Fehlschläge werden gezählt
+def test_catalog_cache_stats():
+    CatalogCache.clear()
+    create_category()
+    client.get("/categories/")
+    client.get("/categories/")
+    client.get("/categories/")
+    stats = client.get("/catalog/cache").json()
+    assert stats["enabled"] is True
+    assert stats["version"] == CatalogVersion.current()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["entries"] == 1
+
+# 9. Abgeschalteter Cache liest jedes Mal aus der Datenbank
+def test_catalog_cache_disabled(monkeypatch):
+    monkeypatch.setattr(CatalogCache, "ENABLED", False)
+    CatalogCache.clear()
+    create_category()
+    client.get("/catalog/")
+    with count_queries() as statements:
+        assert len(client.get("/catalog/").json()["categories"]) == 1
+    assert statements
+    assert client.get("/catalog/cache").json() == {"enabled": False, "version": CatalogVersion.current(), "entries": 0, "hits": 0, "misses": 0}
+
+# 10. ETag auf den Katalog-Endpunkten: 304 bei passendem If-None-Match, neues ETag nach Änderungen
+@pytest.mark.parametrize("url", ["/categories/", "/category-sorting/", "/stock-items/", "/item-sorting/", "/catalog/", "/categories/{cat_id}", "/stock-items/category/{cat_id}"])
+def test_catalog_etag(url):
+    cat_id = create_category()
+    create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    url = url.format(cat_id=cat_id)
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    not_modified = client.get(url, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+    assert client.get(url, headers={"If-None-Match": '"anderes", ' + etag}).status_code == 304
+    create_stock_item("Brezel", create_category("Essen"), [{"name": "groß", "price": 3.0, "bill_steps": 1.0}])
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+# 11. Fehlerantworten tragen kein ETag
+def test_catalog_etag_not_on_errors():
+    response = client.get("/categories/999")
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+
+def read_sse(chunk: str) -> tuple[str, dict]:
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+# 12. Event-Stream: "hello" beim Verbinden, danach je Commit ein Delta mit den geänderten Zeilen
+def test_catalog_events_stream():
+    cat_id = create_category()
+    item = create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    variant = item["item_variants"][0]
+
+    async def scenario():
+        stream = CatalogController._event_stream()
+        name, hello = read_sse(await anext(stream))
+        assert name == "hello"
+        assert hello["etag"] == client.get("/catalog/").headers["ETag"]
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: client.put(f"/categories/{cat_id}", json={"name": "Getränke", "icon": "MdLocalBar"}))
+        name, event = read_sse(await asyncio.wait_for(anext(stream), 5))
+        assert name == "changes"
+        assert event["version"] == hello["version"] + 1
+        assert event["changes"] == [{"entity": "category", "id": cat_id, "op": "upsert", "data": {"id": cat_id, "name": "Getränke", "icon": "MdLocalBar"}}]
+        await loop.run_in_executor(None, lambda: client.put(f"/stock-items/{item['id']}", json={"name": "Bier", "category_id": cat_id, "item_variants": [
+            {"id": variant["id"], "name": "0,5l", "price": 5.0, "bill_steps": 1.0}]}))
+        changes = []
+        while not any(c["entity"] == "item_variant" and c["op"] == "upsert" for c in changes):
+            name, event = read_sse(await asyncio.wait_for(anext(stream), 5))
+            changes += event["changes"]
+        assert event["etag"] == client.get("/catalog/").headers["ETag"]
+        ops = {(c["entity"], c["id"]): c["op"] for c in changes}
+        assert ops[("stock_item", item["id"])] == "delete"
+        assert ops[("item_variant", variant["id"])] == "delete"
+        new_variant = next(c["data"] for c in changes if c["entity"] == "item_variant" and c["op"] == "upsert")
+        assert new_variant["price"] == 5.0
+        await stream.aclose()
+        assert CatalogEvents.subscriber_count() == 0
+    asyncio.run(scenario())
+
+# 13. Ein Client, der nicht hinterherkommt, bekommt ein einzelnes "resync"
+def test_catalog_events_overflow_resync(monkeypatch):
+    monkeypatch.setattr(CatalogEvents, "QUEUE_SIZE", 2)
+    async def scenario():
+        queue = CatalogEvents.subscribe()
+        for _ in range(5): CatalogVersion.bump()
+        await asyncio.sleep(0)
+        events = []
+        while not queue.empty(): events.append(queue.get_nowait())
+        CatalogEvents.unsubscribe(queue)
+        return events
+    events = asyncio.run(scenario())
+    assert [(e["type"], e["version"]) for e in events] == [("resync", CatalogVersion.current())]
+
+# 14. Delta-Sync: nur Zeilen, die seit dem Cursor angelegt oder deaktiviert wurden
+def test_catalog_changes_since_cursor():
+    cat_id = create_category()
+    bier = create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    radler = create_stock_item("Radler", cat_id, [{"name": "0,5l", "price": 4.0, "bill_steps": 1.0}])
+    cursor = client.get("/catalog/").json()["change_cursor"]
+    assert cursor > 0
+    # Der Katalog-Cursor ist konservativ: höchstens bereits bekannte Zeilen werden noch einmal geliefert
+    catch_up = client.get("/catalog/changes", params={"since": cursor}).json()
+    assert {v["id"] for v in catch_up["item_variants"]} <= {bier["item_variants"][0]["id"], radler["item_variants"][0]["id"]}
+    cursor = catch_up["cursor"]
+    assert client.get("/catalog/changes", params={"since": cursor}).json() == {"cursor": cursor, "stock_items": [], "item_variants": []}
+
+    variant = bier["item_variants"][0]
+    client.put(f"/stock-items/{bier['id']}", json={"name": "Bier", "category_id": cat_id, "item_variants": [
+        {"id": variant["id"], "name": "0,5l", "price": 5.0, "bill_steps": 1.0}]})
+    client.delete(f"/stock-items/{radler['id']}")
+    changes = client.get("/catalog/changes", params={"since": cursor}).json()
+    assert changes["cursor"] > cursor
+    items = {i["id"]: i for i in changes["stock_items"]}
+    assert not items[bier["id"]]["is_active"]
+    assert not items[radler["id"]]["is_active"]
+    new_bier = next(i for i in items.values() if i["is_active"])
+    assert new_bier["name"] == "Bier"
+    variants = {v["id"]: v for v in changes["item_variants"]}
+    assert not variants[variant["id"]]["is_active"]
+    assert not variants[radler["item_variants"][0]["id"]]["is_active"]
+    assert [(v["stock_item_id"], v["price"]) for v in variants.values() if v["is_active"]] == [(new_bier["id"], 5.0)]
+    seqs = [i["change_seq"] for i in changes["stock_items"]]
+    assert seqs == sorted(seqs) and min(seqs) > cursor
+
+    # Auf den neuen Cursor folgt nichts mehr, der Katalog-Cursor ist nachgezogen
+    assert client.get("/catalog/changes", params={"since": changes["cursor"]}).json()["stock_items"] == []
+    assert cursor < client.get("/catalog/").json()["change_cursor"] <= changes["cursor"]
+
+def test_catalog_changes_requires_cursor():
+    assert client.get("/catalog/changes").status_code == 422
+    assert client.get("/catalog/changes", params={"since": -1}).status_code == 422
+
+def import_menu(n_items, category="Getränke"):
+    return {"categories": [{"name": category, "icon": "MdLocalBar", "items": [
+        {"name": f"Artikel {i}", "deposit_amount": 1.0, "variants": [
+            {"name": "klein", "price": 2.0 + i, "bill_steps": 1.0}, {"name": "groß", "price": 3.0 + i, "bill_steps": 2.0}]}
+        for i in range(n_items)]}]}
+
+# 15. Import als JSON: Kategorien, Artikel, Varianten und Sortierungen landen im Katalog
+def test_catalog_import_json():
+    existing = create_category("Speisen")
+    create_stock_item("Schnitzel", existing, [{"name": "Portion", "price": 12.0, "bill_steps": 1.0}])
+    payload = import_menu(3)
+    payload["categories"].append({"name": "Speisen", "items": [{"name": "Suppe", "variants": [{"price": 5.0}]}]})
+    response = client.post("/catalog/import", json=payload)
+    assert response.status_code == 201
+    result = response.json()
+    assert (result["categories_created"], result["stock_items_created"], result["item_variants_created"]) == (1, 4, 7)
+
+    catalog = client.get("/catalog/").json()
+    categories = {c["name"]: c["id"] for c in catalog["categories"]}
+    assert set(categories) == {"Speisen", "Getränke"}
+    assert [s["category_id"] for s in sorted(catalog["category_sorting"], key=lambda s: s["sort_order"])] == [existing, categories["Getränke"]]
+    sorted_ids = [s["item_id"] for s in sorted(catalog["item_sorting"], key=lambda s: s["sort_order"])]
+    assert sorted_ids[1:] == result["stock_item_ids"]
+    items = {i["name"]: i for i in catalog["stock_items"]}
+    assert items["Suppe"]["category_id"] == existing
+    assert [(v["name"], v["price"]) for v in items["Artikel 1"]["item_variants"]] == [("klein", 3.0), ("groß", 4.0)]
+    assert items["Artikel 1"]["deposit_amount"] == 1.0
+    assert client.get(f"/stock-items/{items['Artikel 2']['id']}").json()["item_variants"][1]["bill_steps"] == 2.0
+
+# 16. Import als CSV, auch im Excel-Format mit Semikolon und Dezimalkomma
+def test_catalog_import_csv():
+    csv_text = (
+        "category;category_icon;item;deposit_amount;variant;price;bill_steps\n"
+        "Getränke;MdLocalBar;Bier;2;0,5l;4,50;1\n"
+        "Getränke;MdLocalBar;Bier;2;1l;8,50;2\n"
+        "Speisen;;Pommes;;;3,5;\n"
+    )
+    response = client.post("/catalog/import", content=("﻿" + csv_text).encode(), headers={"Content-Type": "text/csv"})
+    assert response.status_code == 201
+    assert response.json()["item_variants_created"] == 3
+    items = {i["name"]: i for i in client.get("/catalog/").json()["stock_items"]}
+    assert items["Bier"]["deposit_amount"] == 2.0
+    assert [(v["name"], v["price"], v["bill_steps"]) for v in items["Bier"]["item_variants"]] == [("0,5l", 4.5, 1.0), ("1l", 8.5, 2.0)]
+    assert [(v["price"], v["bill_steps"]) for v in items["Pommes"]["item_variants"]] == [(3.5, 1.0)]
+    assert {c["icon"] for c in client.get("/categories/").json()} == {"MdLocalBar", "MdCategory"}
+
+    bad = client.post("/catalog/import", content=b"category,item,price\nGetr\xc3\xa4nke,Wasser,abc\n", headers={"Content-Type": "text/csv"})
+    assert bad.status_code == 400
+    assert bad.json()["detail"].startswith("CSV-Zeile 2")
+
+# 17. Ein einziger Fehler bricht den ganzen Import ab, ohne dass etwas geschrieben wird
+@pytest.mark.parametrize("broken", [
+    {"name": "", "variants": [{"price": 1.0}]},
+    {"name": "Kaputt", "variants": []},
+    {"name": "Kaputt", "variants": [{"price": -1.0}]},
+    {"name": "Kaputt", "variants": [{"price": 1.0, "bill_steps": 0}]},
+    {"name": "Kaputt", "variants": [{"name": "a", "price": 1.0}, {"name": "a", "price": 1.0}]},
+    {"name": "Artikel 0", "variants": [{"price": 1.0}]},
+])
+def test_catalog_import_atomic(broken):
+    payload = import_menu(3)
+    payload["categories"][0]["items"].append(broken)
+    version = CatalogVersion.current()
+    response = client.post("/catalog/import", json=payload)
+    assert response.status_code == 400
+    assert CatalogVersion.current() == version
+    assert client.get("/catalog/").json()["stock_items"] == []
+    assert client.get("/categories/").json() == []
+
+# 18. Aktive Artikel gleichen Namens in einer bestehenden Kategorie werden nicht doppelt angelegt
+def test_catalog_import_rejects_existing_item():
+    cat_id = create_category("Getränke")
+    create_stock_item("Artikel 1", cat_id, [{"name": "klein", "price": 3.0, "bill_steps": 1.0}])
+    response = client.post("/catalog/import", json=import_menu(3))
+    assert response.status_code == 400
+    assert "Artikel 1" in response.json()["detail"]
+    assert len(client.get("/catalog/").json()["stock_items"]) == 1
+
+# 19. Mengenbasiert: die Anzahl der Statements hängt nicht von der Größe der Speisekarte ab
+def test_catalog_import_constant_queries():
+    with count_queries() as small:
+        assert client.post("/catalog/import", json=import_menu(2, "Klein")).status_code == 201
+    with count_queries() as large:
+        assert client.post("/catalog/import", json=import_menu(200, "Groß")).status_code == 201
+    assert len(large) == len(small)
+    assert len(client.get("/catalog/").json()["stock_items"]) == 202
+
+# 20. Der Import invalidiert den Cache und meldet den Clients ein "resync"
+def test_catalog_import_resync_event():
+    client.get("/catalog/")
+    async def scenario():
+        queue = CatalogEvents.subscribe()
+        await asyncio.to_thread(client.post, "/catalog/import", json=import_menu(2))
+        event = await asyncio.wait_for(queue.get(), 5)
+        CatalogEvents.unsubscribe(queue)
+        return event
+    event = asyncio.run(scenario())
+    assert (event["type"], event["version"]) == ("resync", CatalogVersion.current())
+    assert len(client.get("/catalog/").json()["stock_items"]) == 2
+
+def catalog_as_of(moment: datetime) -> dict:
+    response = client.get("/catalog/", params={"as_of": moment.isoformat()})
+    assert response.status_code == 200
+    return {i["name"]: [(v["name"], v["price"]) for v in i["item_variants"]] for i in response.json()["stock_items"]}
+
+# 21. Historischer Katalog: as_of liefert die Versionen, die zum Zeitpunkt (z.B. einer Rechnung) gültig waren
+def test_catalog_as_of():
+    before = datetime.now()
+    cat_id = create_category()
+    bier = create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    radler = create_stock_item("Radler", cat_id, [{"name": "0,5l", "price": 4.0, "bill_steps": 1.0}])
+    created = datetime.now()
+    variant = bier["item_variants"][0]
+    client.put(f"/stock-items/{bier['id']}", json={"name": "Helles", "category_id": cat_id, "item_variants": [
+        {"id": variant["id"], "name": "0,5l", "price": 5.0, "bill_steps": 1.0}, {"name": "0,3l", "price": 3.5, "bill_steps": 0.5}]})
+    edited = datetime.now()
+    client.delete(f"/stock-items/{radler['id']}")
+
+    assert catalog_as_of(before) == {}
+    assert catalog_as_of(created) == {"Bier": [("0,5l", 4.5)], "Radler": [("0,5l", 4.0)]}
+    assert catalog_as_of(edited) == {"Helles": [("0,5l", 5.0), ("0,3l", 3.5)], "Radler": [("0,5l", 4.0)]}
+    assert catalog_as_of(datetime.now()) == {"Helles": [("0,5l", 5.0), ("0,3l", 3.5)]}
+    historic = client.get("/catalog/", params={"as_of": created.isoformat()}).json()
+    assert historic["change_cursor"] == 0
+    assert [(i["id"], i["is_active"]) for i in historic["stock_items"]] == [(bier["id"], True), (radler["id"], True)]
+    # Ohne as_of weiterhin der aktuelle, gecachte Katalog
+    assert [i["name"] for i in client.get("/catalog/").json()["stock_items"]] == ["Helles"]
+    response = client.get("/stock-items/", params={"as_of": created.isoformat()})
+    assert [(i["name"], i["item_variants"][0]["price"]) for i in response.json()] == [("Bier", 4.5), ("Radler", 4.0)]
+
+# 22. Auch Sammeländerungen und Importe setzen die Gültigkeit
+def test_catalog_as_of_bulk_and_import():
+    cat_id = create_category()
+    bier = create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    before_import = datetime.now()
+    assert client.post("/catalog/import", json=import_menu(2)).status_code == 201
+    imported = datetime.now()
+    assert client.put("/stock-items/bulk", json=[{"id": bier["id"], "name": "Pils", "category_id": cat_id}]).status_code == 200
+
+    assert catalog_as_of(before_import) == {"Bier": [("0,5l", 4.5)]}
+    assert catalog_as_of(imported) == {"Bier": [("0,5l", 4.5)], "Artikel 0": [("klein", 2.0), ("groß", 3.0)],
+                                       "Artikel 1": [("klein", 3.0), ("groß", 4.0)]}
+    now = catalog_as_of(datetime.now())
+    assert "Bier" not in now and now["Pils"] == [("0,5l", 4.5)]
+
+def test_catalog_as_of_invalid():
+    assert client.get("/catalog/", params={"as_of": "gestern"}).status_code == 422
+
+# 23. Eine neue Variantenversion übernimmt nicht die Gültigkeit der alten
+def test_catalog_as_of_between_variant_updates():
+    cat_id = create_category()
+    bier = create_stock_item("Bier", cat_id, [{"name": "0,5l", "price": 4.5, "bill_steps": 1.0}])
+    db = TestingSessionLocal()
+    try:
+        variant = ItemVariantService.update(db, bier["item_variants"][0]["id"], price=5.0)
+        between = datetime.now()
+        ItemVariantService.update(db, variant.id, price=5.5)
+    finally:
+        db.close()
+    assert catalog_as_of(between) == {"Bier": [("0,5l", 5.0)]}
+    assert catalog_as_of(datetime.now()) == {"Bier": [("0,5l", 5.5)]}
@@ -0,0 +1,201 @@
+from datetime import date, datetime, timedelta
+import json
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from entity.DAO import Base
+import service.BillService as BillService
+import service.StockItemService as StockItemService
+import service.ItemVariantService as ItemVariantService
+import service.DepositReturnService as DepositReturnService
+import service.CatalogService as CatalogService
+import service.StockItemHeadService as StockItemHeadService
+import service.CatalogCache as CatalogCache
+
+# Prüft per EXPLAIN, dass die heißen Lesepfade auf einem großen Datenbestand Indizes nutzen.
+# Kleine Stammdatentabellen (category, item_sorting, ...) dürfen sequenziell gelesen werden.
+
+TEST_DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres_db")
+SQLALCHEMY_TEST_DATABASE_URL = f"postgresql://root:root@{TEST_DATABASE_HOST}:5432/huettenzauber_test"
+engine = create_engine(SQLALCHEMY_TEST_DATABASE_URL)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+LARGE_TABLES = {"bill", "bill_item", "stock_item", "item_variant", "deposit_return"}
+N_STOCK_ITEMS = 20000     # jede 20. Zeile aktiv, der Rest sind alte Versionen
+N_BILLS = 200000          # über ein Jahr verteilt, jede 50. gelöscht
+N_DEPOSIT_RETURNS = 50000
+FIRST_DAY = datetime(2024, 1, 1)
+
+SEED = [
+    "INSERT INTO category (id, name, icon) SELECT i, 'Kategorie ' || i, 'MdCategory' FROM generate_series(1, 10) i",
+    f"""INSERT INTO stock_item (id, category_id, name, deposit_amount, is_active, version)
+        SELECT i, 1 + i % 10, 'Artikel ' || i, 0, i % 20 = 0, 1 FROM generate_series(1, {N_STOCK_ITEMS}) i""",
+    "INSERT INTO item_sorting (item_id, sort_order) SELECT id, id FROM stock_item WHERE is_active",
+    "UPDATE stock_item SET base_item_id = id - id % 20 + 20 WHERE id % 20 <> 0",
+    "INSERT INTO stock_item_head (base_item_id, current_item_id, version) SELECT id, id, 20 FROM stock_item WHERE is_active",
+    # Versionen einer Linie gelten nacheinander je einen Tag, die aktive (id % 20 = 0) seit Tag 20
+    f"""UPDATE stock_item SET valid_from = TIMESTAMP '{FIRST_DAY.isoformat()}' + ((id - 1) % 20) * INTERVAL '1 day',
+        valid_to = CASE WHEN is_active THEN NULL ELSE TIMESTAMP '{FIRST_DAY.isoformat()}' + (id % 20) * INTERVAL '1 day' END""",
+    """INSERT INTO item_variant (stock_item_id, name, price, bill_steps, is_active, version, valid_from, valid_to)
+        SELECT s.id, 'Variante ' || v, v * 1.5, v, s.is_active, 1, s.valid_from, s.valid_to FROM stock_item s, generate_series(1, 3) v""",
+    f"""INSERT INTO bill (id, date, is_deleted, total_amount, deposit_total)
+        SELECT i, TIMESTAMP '{FIRST_DAY.isoformat()}' + (i * INTERVAL '1 year' / {N_BILLS}), i % 50 = 0, 3.0, 0
+        FROM generate_series(1, {N_BILLS}) i""",
+    """INSERT INTO bill_item (bill_id, item_variant_id, item_quantity, item_price, item_deposit_amount, item_name)
+        SELECT b.id, 1 + (b.id * 7 + n) % 3000, 1, 1.5, 0, 'Artikel' FROM bill b, generate_series(1, 2) n""",
+    f"""INSERT INTO deposit_return (stock_item_id, quantity, deposit_amount_per_item, total_amount, created_at)
+        SELECT 20 * (1 + i % 1000), 1, 2.0, 2.0, TIMESTAMP '{FIRST_DAY.isoformat()}' + (i * INTERVAL '1 year' / {N_DEPOSIT_RETURNS})
+        FROM generate_series(1, {N_DEPOSIT_RETURNS}) i""",
+]
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded_database():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in SEED: conn.execute(text(statement))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def db():
+    # Gecachte Lesepfade sollen die Datenbank wirklich abfragen, sonst gibt es keinen Plan zu prüfen
+    CatalogCache.clear()
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@contextmanager
+def capture_selects():
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"): statements.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def seq_scans(plan: dict) -> set:
+    found = {plan["Relation Name"]} if plan["Node Type"] == "Seq Scan" else set()
+    for child in plan.get("Plans", []): found |= seq_scans(child)
+    return found
+
+def assert_no_seq_scan(statements):
+    assert statements
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+            if isinstance(plan, str): plan = json.loads(plan)
+            scanned = seq_scans(plan[0]["Plan"]) & LARGE_TABLES
+            assert not scanned, f"Seq Scan auf {sorted(scanned)}:\n{statement}"
+
+# 1. Erste Seite der Rechnungsliste (Partial Index auf nicht gelöschte Bills, Items über bill_item.bill_id)
+def test_bill_page_uses_index(db):
+    with capture_selects() as statements:
+        bills, cursor = BillService.get_all(db, limit=50)
+    assert len(bills) == 50
+    assert_no_seq_scan(statements)
+
+# 2. Folgeseite über den Keyset-Cursor
+def test_bill_page_with_cursor_uses_index(db):
+    _, cursor = BillService.get_all(db, limit=50)
+    with capture_selects() as statements:
+        bills, _ = BillService.get_all(db, limit=50, cursor=cursor)
+    assert len(bills) == 50
+    assert_no_seq_scan(statements)
+
+# 3. Rechnungen eines Tages
+def test_bill_day_filter_uses_index(db):
+    day = date(2024, 6, 1)
+    with capture_selects() as statements:
+        BillService.get_all(db, limit=50, date_from=day, date_to=day)
+    assert_no_seq_scan(statements)
+
+# 4. Einzelne Rechnung
+def test_bill_by_id_uses_index(db):
+    with capture_selects() as statements:
+        BillService.get_by_id(db, 1234)
+    assert_no_seq_scan(statements)
+
+# 5. Statistik einer Schicht aus den Rohdaten
+def test_bill_stats_time_window_uses_index(db):
+    start = datetime(2024, 6, 1, 18)
+    with capture_selects() as statements:
+        BillService.get_stats(db, start, start + timedelta(hours=2))
+    assert_no_seq_scan(statements)
+
+# 6. Aktive Artikel (Partial Index auf is_active)
+def test_active_stock_items_use_index(db):
+    with capture_selects() as statements:
+        items = StockItemService.get_all(db)
+    assert len(items) == N_STOCK_ITEMS // 20
+    assert_no_seq_scan(statements)
+
+# 7. Aktive Artikel einer Kategorie
+def test_stock_items_in_category_use_index(db):
+    with capture_selects() as statements:
+        StockItemService.get_all_in_category(db, 1)
+    assert_no_seq_scan(statements)
+
+# 8. Varianten eines Artikels (FK-Index item_variant.stock_item_id)
+def test_variants_of_stock_item_use_index(db):
+    with capture_selects() as statements:
+        variants = ItemVariantService.get_all_in_stock_item(db, 40)
+    assert len(variants) == 3
+    assert_no_seq_scan(statements)
+
+# 9. Pfandrückgaben eines Tages (BRIN auf created_at)
+def test_deposit_returns_of_day_use_index(db):
+    day = date(2024, 6, 1)
+    with capture_selects() as statements:
+        returns = DepositReturnService.get_all(db, day, day)
+    assert returns
+    assert_no_seq_scan(statements)
+
+# 10. Pfandrückgaben eines Artikels (FK-Index deposit_return.stock_item_id)
+def test_deposit_returns_of_stock_item_use_index(db):
+    from entity.DAO import DepositReturn
+    with capture_selects() as statements:
+        db.query(DepositReturn).filter(DepositReturn.stock_item_id == 40).all()
+    assert_no_seq_scan(statements)
+
+# 11. Delta-Sync über den Änderungszähler
+def test_catalog_changes_use_index(db):
+    with capture_selects() as statements:
+        CatalogService.get_changes(db, N_STOCK_ITEMS * 4 - 10)
+    assert_no_seq_scan(statements)
+
+# 12. Aktuelle Version eines Artikels über den Kopfzeiger, Altdaten ohne Kopf über den Ausdrucksindex
+def test_stock_item_version_lookup_uses_index(db):
+    with capture_selects() as statements:
+        assert StockItemHeadService.lock_versions(db, [40]) == {40: 20}
+    db.rollback()
+    assert_no_seq_scan(statements)
+    with capture_selects() as statements:
+        assert StockItemHeadService.lock_versions(db, [N_STOCK_ITEMS + 20]) == {}
+    db.rollback()
+    assert_no_seq_scan(statements)
+
+# 13. Alle Versionen eines Artikels, z.B. für Verkäufe über alle Versionen
+def test_stock_item_lineage_uses_index(db):
+    with capture_selects() as statements:
+        ids = db.execute(StockItemHeadService.lineage_ids(35)).scalars().all()
+    assert sorted(ids) == list(range(21, 41))
+    assert_no_seq_scan(statements)
+
+# 14. Katalog zu einem Zeitpunkt (as_of) über den GiST-Index auf tsrange(valid_from, valid_to)
+def test_catalog_as_of_uses_index(db):
+    with capture_selects() as statements:
+        catalog = CatalogService.load(db, FIRST_DAY + timedelta(days=4, hours=12))
+    assert len(catalog["stock_items"]) == N_STOCK_ITEMS // 20
+    assert {i["id"] % 20 for i in catalog["stock_items"]} == {5}
+    assert_no_seq_scan(statements)
@@ -7,6 +7,7 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from app import app
 from database import get_db
+from conftest import count_queries
 from entity.DAO import Base
 
 TEST_DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres_db")
@@ -277,8 +278,9 @@ def test_bulk_update_partial_failure():
     response2 = client.get("/stock-items/")
     assert response2.status_code == 200
     items = response2.json()
-    updated = [item for item in items if item["name"] == "BulkPartial1-Changed" and item["category_id"] == cat_id]
-    assert len(updated) == 1
+    # Alles oder nichts: der gültige Eintrag wird nicht übernommen
+    assert [item["name"] for item in items] == ["BulkPartial1"]
+    assert items[0]["id"] == item1_id
 
 def test_bulk_update_duplicate_id_in_payload():
     cat_id = create_category()
@@ -701,4 +703,195 @@ def test_update_stock_item_variant_with_string_bill_steps():
         "category_id": cat_id,
         "item_variants": [variant]
     })
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+@pytest.mark.parametrize("url", ["/stock-items/", "/stock-items/category/{cat_id}"])
+def test_list_stock_items_query_count_is_constant(url):
+    cat_id = create_category()
+    create_stock_item("Item0", cat_id, [{"name": "Klein", "price": 1.0, "bill_steps": 1.0}, {"name": "Groß", "price": 2.0, "bill_steps": 2.0}])
+    with count_queries() as few:
+        assert len(client.get(url.format(cat_id=cat_id)).json()) == 1
+    for i in range(1, 12): create_stock_item(f"Item{i}", cat_id)
+    with count_queries() as many:
+        data = client.get(url.format(cat_id=cat_id)).json()
+    assert len(data) == 12
+    assert len(data[0]["item_variants"]) == 2
+    assert len(many) == len(few)
+
+def test_list_stock_items_only_active_variants():
+    cat_id = create_category()
+    item_id = create_stock_item("Mixed", cat_id, [{"name": "Aktiv", "price": 1.0, "bill_steps": 1.0}, {"price": 2.0, "bill_steps": 0.5}])
+    db = TestingSessionLocal()
+    try:
+        from entity.DAO import ItemVariant
+        db.query(ItemVariant).filter(ItemVariant.name == "Aktiv").update({"is_active": False})
+        db.commit()
+    finally:
+        db.close()
+    for response in (client.get("/stock-items/"), client.get(f"/stock-items/category/{cat_id}")):
+        assert [v["name"] for v in response.json()[0]["item_variants"]] == ["0.5"]
+    assert [v["name"] for v in client.get(f"/stock-items/{item_id}").json()["item_variants"]] == ["0.5"]
+
+def test_bulk_update_moves_variants_and_sorting():
+    cat_id = create_category()
+    other_cat = create_category("Other", "MdOther")
+    item1_id = create_stock_item("Move1", cat_id, [{"name": "Klein", "price": 1.0, "bill_steps": 1.0}, {"name": "Groß", "price": 2.0, "bill_steps": 2.0}])
+    item2_id = create_stock_item("Move2", cat_id)
+    response = client.put("/stock-items/bulk", json=[
+        {"id": item2_id, "name": "Move2", "category_id": other_cat},
+        {"id": item1_id, "name": "Move1", "category_id": other_cat},
+    ])
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["name"] for item in data] == ["Move2", "Move1"]
+    assert all(item["category_id"] == other_cat and item["id"] not in (item1_id, item2_id) for item in data)
+    assert [(v["name"], v["price"]) for v in data[1]["item_variants"]] == [("Klein", 1.0), ("Groß", 2.0)]
+    # Die neuen Versionen übernehmen Varianten und Sortierung der alten
+    items = client.get("/stock-items/").json()
+    assert [item["id"] for item in items] == [data[1]["id"], data[0]["id"]]
+    assert [v["name"] for v in items[0]["item_variants"]] == ["Klein", "Groß"]
+    assert client.get(f"/stock-items/{item1_id}").status_code == 404
+
+def test_bulk_update_duplicate_is_atomic():
+    cat_id = create_category()
+    item1_id = create_stock_item("Atomic1", cat_id)
+    item2_id = create_stock_item("Atomic2", cat_id)
+    create_stock_item("Taken", cat_id)
+    response = client.put("/stock-items/bulk", json=[
+        {"id": item1_id, "name": "Atomic1-Neu", "category_id": cat_id},
+        {"id": item2_id, "name": "Taken", "category_id": cat_id},
+    ])
+    assert response.status_code == 400
+    assert sorted(item["name"] for item in client.get("/stock-items/").json()) == ["Atomic1", "Atomic2", "Taken"]
+
+def test_bulk_update_swap_names():
+    cat_id = create_category()
+    item1_id = create_stock_item("SwapA", cat_id)
+    item2_id = create_stock_item("SwapB", cat_id)
+    response = client.put("/stock-items/bulk", json=[
+        {"id": item1_id, "name": "SwapB", "category_id": cat_id},
+        {"id": item2_id, "name": "SwapA", "category_id": cat_id},
+    ])
+    assert response.status_code == 200
+    assert [item["name"] for item in response.json()] == ["SwapB", "SwapA"]
+
+def test_bulk_update_query_count_is_constant():
+    cat_id = create_category()
+    other_cat = create_category("Other", "MdOther")
+    ids = [create_stock_item(f"Bulk{i}", cat_id) for i in range(12)]
+    with count_queries() as few:
+        assert client.put("/stock-items/bulk", json=[{"id": ids[0], "name": "Bulk0", "category_id": other_cat}]).status_code == 200
+    with count_queries() as many:
+        response = client.put("/stock-items/bulk", json=[{"id": item_id, "name": f"Bulk{i}", "category_id": other_cat} for i, item_id in enumerate(ids[1:], 1)])
+    assert response.status_code == 200
+    assert all(len(item["item_variants"]) == 1 for item in response.json())
+    assert len(many) == len(few)
+
+def test_update_stock_item_is_atomic():
+    cat_id = create_category()
+    item_id = create_stock_item("AtomicUpdate", cat_id, [{"name": "A", "price": 1.0, "bill_steps": 1.0}, {"name": "B", "price": 2.0, "bill_steps": 2.0}])
+    variants = client.get(f"/stock-items/{item_id}").json()["item_variants"]
+    variants[1]["price"] = -1.0
+    response = client.put(f"/stock-items/{item_id}", json={"name": "AtomicUpdate-Neu", "category_id": cat_id, "item_variants": variants})
+    assert response.status_code == 400
+    # Weder Artikel noch erste Variante wurden versioniert
+    items = client.get("/stock-items/").json()
+    assert [(item["id"], item["name"]) for item in items] == [(item_id, "AtomicUpdate")]
+    assert [v["id"] for v in items[0]["item_variants"]] == [v["id"] for v in variants]
+
+def test_update_stock_item_deactivates_removed_variants():
+    cat_id = create_category()
+    item_id = create_stock_item("Removed", cat_id, [{"name": "A", "price": 1.0, "bill_steps": 1.0}, {"name": "B", "price": 2.0, "bill_steps": 2.0}])
+    variants = client.get(f"/stock-items/{item_id}").json()["item_variants"]
+    response = client.put(f"/stock-items/{item_id}", json={"name": "Removed", "category_id": cat_id, "item_variants": variants[:1]})
+    assert response.status_code == 200
+    db = TestingSessionLocal()
+    try:
+        from entity.DAO import ItemVariant
+        assert [(v.stock_item_id, v.is_active) for v in db.query(ItemVariant).filter(ItemVariant.id == variants[1]["id"])] == [(item_id, False)]
+        assert db.query(ItemVariant).filter(ItemVariant.is_active).count() == 1
+    finally:
+        db.close()
+
+def test_update_stock_item_query_count_is_constant():
+    cat_id = create_category()
+    few_id = create_stock_item("Few", cat_id, [{"name": "A", "price": 1.0, "bill_steps": 1.0}])
+    many_id = create_stock_item("Many", cat_id, [{"name": f"V{i}", "price": 1.0 + i, "bill_steps": 1.0} for i in range(8)])
+    def put(item_id, name):
+        variants = client.get(f"/stock-items/{item_id}").json()["item_variants"]
+        variants.append({"name": "Neu", "price": 99.0, "bill_steps": 1.0})
+        with count_queries() as statements:
+            response = client.put(f"/stock-items/{item_id}", json={"name": name, "category_id": cat_id, "item_variants": variants})
+        assert response.status_code == 200
+        assert len(response.json()["item_variants"]) == len(variants)
+        return statements
+    assert len(put(many_id, "Many")) == len(put(few_id, "Few"))
+
+def test_stock_item_head_follows_versions():
+    from entity.DAO import StockItem, StockItemHead
+    import service.StockItemHeadService as StockItemHeadService
+    cat_id = create_category()
+    other_cat = create_category("Other", "MdOther")
+    item_id = create_stock_item("Head", cat_id)
+    v2 = client.put(f"/stock-items/{item_id}", json={"name": "Head2", "category_id": cat_id}).json()["id"]
+    v3 = client.put("/stock-items/bulk", json=[{"id": v2, "name": "Head2", "category_id": other_cat}]).json()[0]["id"]
+    db = TestingSessionLocal()
+    try:
+        def heads():
+            db.expire_all()
+            return [(h.base_item_id, h.current_item_id, h.version) for h in db.query(StockItemHead)]
+        assert heads() == [(item_id, v3, 3)]
+        assert sorted(db.execute(StockItemHeadService.lineage_ids(v2)).scalars()) == [item_id, v2, v3]
+        # Neuaufbau aus stock_item liefert denselben Stand
+        StockItemHeadService.rebuild(db)
+        assert heads() == [(item_id, v3, 3)]
+        # Fehlt der Kopf (Altdaten), wird die Version aus den Artikelzeilen bestimmt
+        db.query(StockItemHead).delete()
+        db.commit()
+        assert client.put(f"/stock-items/{v3}", json={"name": "Head4", "category_id": other_cat}).status_code == 200
+        assert [h[1:] for h in heads()] == [(db.query(StockItem.id).filter(StockItem.is_active).scalar(), 4)]
+    finally:
+        db.close()
+
+def test_duplicates_rejected_by_unique_indexes():
+    cat_id = create_category()
+    item_id = create_stock_item("Unique", cat_id, [{"name": "Klein", "price": 1.0, "bill_steps": 1.0}])
+    # Ohne vorherige Duplikatsuche: die Meldung kommt aus der Constraint-Verletzung
+    with count_queries() as statements:
+        response = client.post("/stock-items/", json={"name": "Unique", "category_id": cat_id, "item_variants": []})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Artikel mit diesem Namen existiert bereits in dieser Kategorie und ist aktiv"
+    assert not any("stock_item.name = " in statement for statement in statements)
+
+    import service.ItemVariantService as ItemVariantService
+    from fastapi import HTTPException
+    db = TestingSessionLocal()
+    try:
+        for name, price, bill_steps, detail in [
+            ("Klein", 1.0, 2.0, "Variante mit gleichem Namen und gleichem Preis existiert bereits"),
+            ("Klein", 1.0, 1.0, "Variante mit gleichem Namen und gleichem Preis existiert bereits"),
+            ("Klein", 3.0, 1.0, "Variante mit gleichem Namen und gleichem Rechenschritt aber anderem Preis existiert bereits"),
+        ]:
+            with pytest.raises(HTTPException) as error:
+                ItemVariantService.create(db, item_id, name, price, bill_steps)
+            assert (error.value.status_code, error.value.detail) == (400, detail)
+        # Eine neue Version derselben Variante ist kein Duplikat der alten
+        variant_id = client.get(f"/stock-items/{item_id}").json()["item_variants"][0]["id"]
+        assert ItemVariantService.update(db, variant_id, "Klein", 1.0, 1.0).version == 2
+    finally:
+        db.close()
+
+def test_variant_fallback_name_not_written():
+    cat_id = create_category()
+    response = client.post("/stock-items/", json={"name": "Unnamed", "category_id": cat_id, "item_variants": [
+        {"price": 1.0, "bill_steps": 0.5}, {"price": 2.0, "bill_steps": 1.0}]})
+    assert response.status_code == 201
+    assert [v["name"] for v in response.json()["item_variants"]] == ["0.5", "1.0"]
+    assert [v["name"] for v in client.get(f"/stock-items/{response.json()['id']}").json()["item_variants"]] == ["0.5", "1.0"]
+    # Der Ersatzname ist nur Darstellung, in der Datenbank bleibt der Name leer
+    db = TestingSessionLocal()
+    try:
+        from entity.DAO import ItemVariant
+        assert [v.name for v in db.query(ItemVariant).order_by(ItemVariant.id)] == [None, None]
+    finally:
+        db.close()